@@ -1,12 +1,17 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import plotly.express as px
+import hmac
 import dash_bootstrap_components as dbc
 import dash
 from dash.dependencies import Input, Output
-from dash import Dash, html, dcc, dash_table
+from dash import Dash, html, dcc
+from flask import Response, abort, jsonify, request
+from plotly.io.json import to_json_plotly
+
+import config
+from core import cache, clientside, dataset, export, ingest, metrics, transport
 
 app = Dash(__name__, use_pages=True)
+# WSGI entry point: `gunicorn app:server` (settings in gunicorn.conf.py)
+server = app.server
 
 app.layout = html.Div([
     # Website Heading
@@ -33,6 +38,11 @@ app.layout = html.Div([
                     "Custom comparison", href="/custom-comparison"
                 )
             ),
+            dbc.Col(
+                dcc.Link(
+                    "All countries", href="/all-countries"
+                )
+            ),
         ], className="navbar-options")
     ], className="navbar"),
 
@@ -67,7 +77,8 @@ app.layout = html.Div([
 ])
 
 
-@app.callback(
+@clientside.callback(
+    'page_heading',
     Output('page-heading', 'children'),
     Input('url', 'pathname')
 )
@@ -76,9 +87,95 @@ def update_page_heading(pathname):
         return "Custom comparisons"
     elif pathname == "/compare-countries":
         return "Cross-Country Comparisons"
+    elif pathname == "/all-countries":
+        return "All countries"
     else:
         return "Stats for a country"
 
 
+@app.server.route('/cache-stats')
+def cache_stats():
+    # Hit, miss and eviction counters of every server-side cache in this worker
+    return jsonify(cache.stats())
+
+
+metrics.instrument(app.server)
+# After the metrics, so compression runs before they record the sizes
+transport.install(app.server, compression=config.COMPRESSION)
+
+
+@app.server.route('/metrics')
+def prometheus_metrics():
+    # Per-callback timings, sizes and rows, and the cache counters, of this worker
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@app.server.before_request
+def start_dataset_watcher():
+    # One watcher per worker process; a no-op once it runs
+    dataset.watch()
+
+
+def check_reload_token():
+    token = request.headers.get('X-Reload-Token', '')
+    if config.RELOAD_TOKEN is None or not hmac.compare_digest(token, config.RELOAD_TOKEN):
+        abort(403)
+
+
+@app.server.route('/reload-data', methods=['POST'])
+def reload_data():
+    # Loads a refreshed CSV in the background of the worker that answers;
+    # the others pick it up through their watchers
+    check_reload_token()
+    started = dataset.reload_in_background()
+    return jsonify(version=dataset.version(), reloading=True, started=started), 202
+
+
+@app.server.route('/ingest', methods=['POST'])
+def ingest_rows():
+    # Appends new country-years (CSV, or JSON records) in the worker that
+    # answers; the others load the updated snapshot through their watchers
+    check_reload_token()
+    try:
+        if request.is_json:
+            delta = ingest.read_records(request.get_json(silent=True))
+        else:
+            delta = ingest.read_csv(request.get_data())
+        return jsonify(ingest.ingest(delta))
+    except ingest.IngestError as e:
+        return jsonify(problems=e.problems), 400
+
+
+@app.server.route('/export')
+def export_selection():
+    # Streams the rows of a page's selection as CSV or Parquet, chunk by
+    # chunk (see core.export)
+    data = dataset.current()
+    try:
+        selected, export_format = export.parse(request.args, data)
+    except export.ExportError as e:
+        return jsonify(problems=[str(e)]), 400
+    body, mimetype, name = export.stream(data, selected, export_format)
+    return Response(body, mimetype=mimetype, headers={'Content-Disposition': f'attachment; filename="{name}"'})
+
+
+def report_layout_sizes():
+    # Each page's layout is the payload the browser downloads before any
+    # callback fires, so keep an eye on how big it is
+    for page in dash.page_registry.values():
+        layout = page['layout']() if callable(page['layout']) else page['layout']
+        page['layout_bytes'] = len(to_json_plotly(layout))
+        app.logger.info('Initial layout of %s: %d bytes', page['path'], page['layout_bytes'])
+
+
+report_layout_sizes()
+
+if config.CLIENTSIDE:
+    # The browser computes everything from the exported bundle, so it has to
+    # match the dataset this process serves
+    clientside.ensure()
+    dataset.on_reload(clientside.ensure)
+
+
 if __name__ == '__main__':
     app.run_server(debug=True)
@@ -0,0 +1,698 @@
+// Browser side of the clientside mode (DASHBOARD_CLIENTSIDE=1, see
+// core/clientside.py).
+//
+// The page callbacks are registered against the functions below instead of
+// the Flask server. They fetch the exported bundle once, then redo in the
+// browser what the Python callbacks do: resolve the selection like
+// core/selection.py, roll the cube cells up like core/cube.py, and build the
+// same traces as core/charts.py. The store payload carries the same
+// `metrics` as in server mode, so metrics.js formats the cards either way.
+
+(function () {
+    var DIMENSIONS = ['country', 'year', 'sex', 'age', 'generation'];
+    var MEASURES = ['suicides_no', 'population', 'suicides_100k_pop', 'gdp_per_capita ($)'];
+    var AGE_ORDER = ['5-14 years', '15-24 years', '25-34 years', '35-54 years', '55-74 years', '75+ years'];
+
+    var loading = null;
+
+    function load() {
+        if (loading === null) {
+            var config = JSON.parse(document.getElementById('_dash-config').textContent);
+            loading = fetch(config.requests_pathname_prefix + 'assets/bundle/data.json')
+                .then(function (response) {
+                    if (!response.ok) {
+                        throw new Error('Could not load the data bundle: HTTP ' + response.status);
+                    }
+                    return response.json();
+                })
+                .then(prepare)
+                .catch(function (error) {
+                    // Let the next callback try again
+                    loading = null;
+                    throw error;
+                });
+        }
+        return loading;
+    }
+
+    function prepare(bundle) {
+        bundle.countryCodes = Object.create(null);
+        bundle.labels.country.forEach(function (country, code) {
+            bundle.countryCodes[country] = code;
+        });
+        return bundle;
+    }
+
+    function clone(value) {
+        return JSON.parse(JSON.stringify(value));
+    }
+
+    function prevent() {
+        throw window.dash_clientside.PreventUpdate;
+    }
+
+    // core/index.py: latest year <= `year` with a non-zero suicide rate
+    function lastYearWithData(bundle, country, year) {
+        var code = bundle.countryCodes[country];
+        if (code === undefined) {
+            return null;
+        }
+        var years = bundle.data_years[code];
+        var lo = 0;
+        var hi = years.length;
+        while (lo < hi) {
+            var mid = (lo + hi) >> 1;
+            if (years[mid] <= year) {
+                lo = mid + 1;
+            } else {
+                hi = mid;
+            }
+        }
+        return lo ? years[lo - 1] : null;
+    }
+
+    // core/selection.py: per-country (country, [first, last]) spans
+    function resolve(bundle, countries, yearRange) {
+        var range = [Number(yearRange[0]), Number(yearRange[1])];
+        var seen = Object.create(null);
+        var spans = [];
+        countries.forEach(function (country) {
+            // A country picked twice is selected once
+            if (country in seen) {
+                return;
+            }
+            seen[country] = true;
+            // The upper bound is clamped to the last year with data and
+            // carried over from one country to the next
+            var lastYear = lastYearWithData(bundle, country, range[1]);
+            if (lastYear !== null) {
+                range[1] = lastYear;
+            }
+            spans.push([country, [range[0], range[1]]]);
+        });
+        return spans;
+    }
+
+    // core/cube.py: the cells of a selection
+    function View(bundle, spans, sex) {
+        var cells = bundle.cells;
+        var sexCode = sex === 'both' ? null : bundle.labels.sex.indexOf(sex);
+        this.bundle = bundle;
+        this.spans = spans;
+        this.countries = spans.map(function (span) { return span[0]; });
+        this.cells = [];
+        this.cellCountries = [];
+        this.counts = spans.map(function (span) {
+            var code = bundle.countryCodes[span[0]];
+            var count = 0;
+            if (code === undefined) {
+                return count;
+            }
+            var first = span[1][0] - bundle.first_year;
+            var last = span[1][1] - bundle.first_year;
+            for (var i = bundle.offsets[code]; i < bundle.offsets[code + 1]; i++) {
+                if (cells.year[i] >= first && cells.year[i] <= last && (sexCode === null || cells.sex[i] === sexCode)) {
+                    this.cells.push(i);
+                    this.cellCountries.push(span[0]);
+                    count += cells.rows[i];
+                }
+            }
+            return count;
+        }, this);
+    }
+
+    // Label of the j-th selected cell along `dim`
+    View.prototype.label = function (dim, j) {
+        var i = this.cells[j];
+        if (dim === 'country') {
+            return this.cellCountries[j];
+        }
+        if (dim === 'year') {
+            return this.bundle.first_year + this.bundle.cells.year[i];
+        }
+        return this.bundle.labels[dim][this.bundle.cells[dim][i]];
+    };
+
+    // `groupby(keys).sum().reset_index()` of the selected rows, with a zero
+    // placeholder row for a country without data when keys are only
+    // country and year, as `CubeView.frame` returns it
+    View.prototype.frame = function (keys) {
+        var self = this;
+        var cells = this.bundle.cells;
+        var dims = DIMENSIONS.filter(function (dim) { return keys.indexOf(dim) >= 0; });
+        var groups = new Map();
+        var frame = [];
+
+        function row(labels) {
+            var line = {rows: 0};
+            dims.forEach(function (dim, i) { line[dim] = labels[i]; });
+            MEASURES.forEach(function (measure) { line[measure] = 0; });
+            return line;
+        }
+
+        this.cells.forEach(function (i, j) {
+            var labels = dims.map(function (dim) { return self.label(dim, j); });
+            var id = JSON.stringify(labels);
+            var line = groups.get(id);
+            if (line === undefined) {
+                line = row(labels);
+                groups.set(id, line);
+                frame.push(line);
+            }
+            line.rows += cells.rows[i];
+            MEASURES.forEach(function (measure) { line[measure] += cells[measure][i]; });
+        });
+
+        if (dims.every(function (dim) { return dim === 'country' || dim === 'year'; })) {
+            this.spans.forEach(function (span, i) {
+                if (self.counts[i] === 0) {
+                    var placeholder = {country: span[0], year: span[1][0]};
+                    frame.push(row(dims.map(function (dim) { return placeholder[dim]; })));
+                }
+            });
+        }
+
+        return frame.sort(function (a, b) {
+            for (var k = 0; k < keys.length; k++) {
+                if (a[keys[k]] < b[keys[k]]) {
+                    return -1;
+                }
+                if (a[keys[k]] > b[keys[k]]) {
+                    return 1;
+                }
+            }
+            return 0;
+        });
+    };
+
+    // Label of the first largest (or smallest) `measure`, like idxmax/idxmin
+    View.prototype.idx = function (measure, key, smallest) {
+        var best = null;
+        this.frame([key]).forEach(function (line) {
+            if (best === null || (smallest ? line[measure] < best[measure] : line[measure] > best[measure])) {
+                best = line;
+            }
+        });
+        return best === null ? null : best[key];
+    };
+
+    View.prototype.hasRows = function () {
+        return this.cells.length > 0;
+    };
+
+    function column(frame, name) {
+        return frame.map(function (line) { return line[name]; });
+    }
+
+    function byAge(frame) {
+        // Stable sort on the ordered age categories; unknown ages go last
+        function rank(line) {
+            var i = AGE_ORDER.indexOf(line.age);
+            return i < 0 ? AGE_ORDER.length : i;
+        }
+        return frame.slice().sort(function (a, b) { return rank(a) - rank(b); });
+    }
+
+    // core/charts.py
+    function groups(bundle, frame, color) {
+        // Plotly Express assigns colours in order of first appearance
+        var names = [];
+        var members = new Map();
+        frame.forEach(function (line) {
+            if (!members.has(line[color])) {
+                names.push(line[color]);
+                members.set(line[color], []);
+            }
+            members.get(line[color]).push(line);
+        });
+        return names.map(function (name, i) {
+            return [name, members.get(name), bundle.colors[i % bundle.colors.length]];
+        });
+    }
+
+    function lineTraces(bundle, frame, x, y, color) {
+        return groups(bundle, frame, color).map(function (group) {
+            return {
+                'type': 'scatter',
+                'mode': 'lines',
+                'name': group[0],
+                'legendgroup': group[0],
+                'showlegend': true,
+                'line': {'color': group[2], 'dash': 'solid'},
+                'marker': {'symbol': 'circle'},
+                'orientation': 'v',
+                'x': column(group[1], x),
+                'y': column(group[1], y),
+                'xaxis': 'x',
+                'yaxis': 'y',
+                'hovertemplate': color + '=' + group[0] + '<br>' + x + '=%{x}<br>' + y + '=%{y}<extra></extra>'
+            };
+        });
+    }
+
+    function polarTraces(bundle, frame, r, theta, color) {
+        return groups(bundle, frame, color).map(function (group) {
+            // Close each line by repeating its first point
+            var rs = column(group[1], r);
+            var thetas = column(group[1], theta);
+            return {
+                'type': 'scatterpolar',
+                'mode': 'lines',
+                'name': group[0],
+                'legendgroup': group[0],
+                'showlegend': true,
+                'line': {'color': group[2], 'dash': 'solid'},
+                'marker': {'symbol': 'circle'},
+                'r': rs.concat(rs.slice(0, 1)),
+                'theta': thetas.concat(thetas.slice(0, 1)),
+                'subplot': 'polar',
+                'hovertemplate': color + '=' + group[0] + '<br>' + r + '=%{r}<br>' + theta + '=%{theta}<extra></extra>'
+            };
+        });
+    }
+
+    function boxTraces(bundle, frame, x, y) {
+        return [{
+            'type': 'box',
+            'name': '',
+            'legendgroup': '',
+            'showlegend': false,
+            'alignmentgroup': 'True',
+            'offsetgroup': '',
+            'notched': false,
+            'marker': {'color': bundle.colors[0]},
+            'orientation': 'v',
+            'x': column(frame, x),
+            'y': column(frame, y),
+            'x0': ' ',
+            'y0': ' ',
+            'xaxis': 'x',
+            'yaxis': 'y',
+            'hovertemplate': x + '=%{x}<br>' + y + '=%{y}<extra></extra>'
+        }];
+    }
+
+    function barTraces(bundle, frame, x, y, color) {
+        return groups(bundle, frame, color).map(function (group) {
+            return {
+                'type': 'bar',
+                'name': group[0],
+                'legendgroup': group[0],
+                'showlegend': true,
+                'alignmentgroup': 'True',
+                'offsetgroup': group[0],
+                'marker': {'color': group[2], 'pattern': {'shape': ''}},
+                'orientation': 'h',
+                'textposition': 'auto',
+                'x': column(group[1], x),
+                'y': column(group[1], y),
+                'xaxis': 'x',
+                'yaxis': 'y',
+                'hovertemplate': color + '=' + group[0] + '<br>' + x + '=%{x}<br>' + y + '=%{y}<extra></extra>'
+            };
+        });
+    }
+
+    function figure(layout, traces) {
+        return {'data': traces, 'layout': layout};
+    }
+
+    function agePie(bundle, chartData, country) {
+        if (chartData.length === 0) {
+            return clone(bundle.figures.pie_empty);
+        }
+        chartData = byAge(chartData);
+        var fig = clone(bundle.figures.pie);
+        fig.data[0].labels = column(chartData, 'age');
+        fig.data[0].values = column(chartData, 'suicides_100k_pop');
+        fig.layout.title.text = country;
+        return fig;
+    }
+
+    // core/overview.py: every country's yearly series, fitted into a budget
+    var OVERVIEW_MEASURE = 'suicides_100k_pop';
+    var OVERVIEW_BANDS = [[0, 100], [10, 90], [25, 75]];
+
+    function overviewSeries(bundle, countries, yearRange, sex) {
+        var cells = bundle.cells;
+        var sexCode = sex === 'both' ? null : bundle.labels.sex.indexOf(sex);
+        var lastYear = bundle.first_year;
+        for (var i = 0; i < cells.year.length; i++) {
+            lastYear = Math.max(lastYear, bundle.first_year + cells.year[i]);
+        }
+        var years = [];
+        for (var year = Math.max(Number(yearRange[0]), bundle.first_year); year <= Math.min(Number(yearRange[1]), lastYear); year++) {
+            years.push(year);
+        }
+        // Countries keep the order of the data, whatever the order they were
+        // picked in
+        var wanted = new Set(countries || []);
+        var names = bundle.labels.country.filter(function (country) { return !wanted.size || wanted.has(country); });
+        var values = names.map(function (country) {
+            var code = bundle.countryCodes[country];
+            var sums = years.map(function () { return 0; });
+            var rows = years.map(function () { return 0; });
+            for (var i = bundle.offsets[code]; i < bundle.offsets[code + 1]; i++) {
+                var j = bundle.first_year + cells.year[i] - years[0];
+                if (j >= 0 && j < years.length && (sexCode === null || cells.sex[i] === sexCode)) {
+                    sums[j] += cells[OVERVIEW_MEASURE][i];
+                    rows[j] += cells.rows[i];
+                }
+            }
+            // Years without rows are gaps, not zeros
+            return sums.map(function (sum, j) { return rows[j] ? Math.round(sum * 100) / 100 : NaN; });
+        });
+        return {names: names, years: years, values: values};
+    }
+
+    function overviewPoints(values) {
+        return values.reduce(function (total, row) {
+            return total + row.filter(function (value) { return !isNaN(value); }).length;
+        }, 0);
+    }
+
+    function overviewFit(values, detail, budget) {
+        if (detail === 'auto' && overviewPoints(values) > budget.max_points) {
+            return 'bands';
+        }
+        return values.length > budget.max_traces ? 'packed' : 'traces';
+    }
+
+    // Linear interpolation between the closest ranks, as numpy does
+    function percentile(sorted, q) {
+        if (!sorted.length) {
+            return NaN;
+        }
+        var position = q / 100 * (sorted.length - 1);
+        var low = Math.floor(position);
+        var high = Math.min(low + 1, sorted.length - 1);
+        return Math.round((sorted[low] + (sorted[high] - sorted[low]) * (position - low)) * 100) / 100;
+    }
+
+    function glLineTraces(bundle, names, years, values, y) {
+        return names.map(function (name, i) {
+            var x = [];
+            var ys = [];
+            values[i].forEach(function (value, j) {
+                if (!isNaN(value)) {
+                    x.push(years[j]);
+                    ys.push(value);
+                }
+            });
+            return {
+                'type': 'scattergl',
+                'mode': 'lines',
+                'name': name,
+                'legendgroup': name,
+                'showlegend': names.length <= 20,
+                'line': {'color': bundle.colors[i % bundle.colors.length], 'dash': 'solid'},
+                'x': x,
+                'y': ys,
+                'hovertemplate': 'country=' + name + '<br>year=%{x}<br>' + y + '=%{y}<extra></extra>'
+            };
+        });
+    }
+
+    function packedLineTraces(bundle, names, years, values, y) {
+        return bundle.colors.slice(0, names.length).map(function (color, c) {
+            var trace = {
+                'type': 'scattergl',
+                'mode': 'lines',
+                'name': '',
+                'showlegend': false,
+                'line': {'color': color, 'width': 1},
+                'x': [],
+                'y': [],
+                'text': [],
+                'hovertemplate': 'country=%{text}<br>year=%{x}<br>' + y + '=%{y}<extra></extra>'
+            };
+            for (var i = c; i < names.length; i += bundle.colors.length) {
+                values[i].forEach(function (value, j) {
+                    if (!isNaN(value)) {
+                        trace.x.push(years[j]);
+                        trace.y.push(value);
+                        trace.text.push(names[i]);
+                    }
+                });
+                // A gap breaks the line from the next one
+                trace.x.push(null);
+                trace.y.push(null);
+                trace.text.push(names[i]);
+            }
+            return trace;
+        });
+    }
+
+    function bandTraces(bundle, years, values, y) {
+        var color = bundle.colors[0];
+        var columns = years.map(function (year, j) {
+            return values.map(function (row) { return row[j]; })
+                .filter(function (value) { return !isNaN(value); })
+                .sort(function (a, b) { return a - b; });
+        });
+        function line(q) {
+            return columns.map(function (column) { return percentile(column, q); });
+        }
+        function rgba(opacity) {
+            return 'rgba(' + [1, 3, 5].map(function (i) { return parseInt(color.slice(i, i + 2), 16); }).join(',') + ',' + opacity + ')';
+        }
+        var traces = [];
+        OVERVIEW_BANDS.forEach(function (band, b) {
+            var name = band[0] === 0 && band[1] === 100 ? 'min-max' : 'p' + band[0] + '-p' + band[1];
+            band.forEach(function (q, k) {
+                traces.push({
+                    'type': 'scattergl',
+                    'mode': 'lines',
+                    'name': name,
+                    'legendgroup': name,
+                    'showlegend': k === 1,
+                    'line': {'color': color, 'width': 0},
+                    'fill': k === 1 ? 'tonexty' : 'none',
+                    'fillcolor': rgba([0.15, 0.25, 0.35][b]),
+                    'x': years,
+                    'y': line(q),
+                    'hovertemplate': 'p' + q + '<br>year=%{x}<br>' + y + '=%{y}<extra></extra>'
+                });
+            });
+        });
+        traces.push({
+            'type': 'scattergl',
+            'mode': 'lines',
+            'name': 'median',
+            'legendgroup': 'median',
+            'showlegend': true,
+            'line': {'color': color, 'width': 2},
+            'x': years,
+            'y': line(50),
+            'hovertemplate': 'median<br>year=%{x}<br>' + y + '=%{y}<extra></extra>'
+        });
+        return traces;
+    }
+
+    // pages/all_countries.py: `summary`
+    function overviewSummary(countries, points, how, budget) {
+        var text = countries.toLocaleString('en-US') + ' countries, ' + points.toLocaleString('en-US') + ' points';
+        if (how === 'bands') {
+            return text + ': more than ' + budget.max_points.toLocaleString('en-US') + ', shown as percentiles across the countries';
+        }
+        if (how === 'packed') {
+            return text + ': one WebGL trace per colour, hover a line for its country';
+        }
+        return text;
+    }
+
+    // Metric numbers of each page, as `metric_values` in the page modules
+    function lastYearOf(frame) {
+        return Math.max.apply(null, column(frame, 'year'));
+    }
+
+    function sumWhere(frame, measure, year) {
+        return frame.reduce(function (total, line) {
+            return line.year === year ? total + line[measure] : total;
+        }, 0);
+    }
+
+    var METRICS = {
+        single: function (view) {
+            var yearly = new Map();
+            var frame = view.frame(['year']);
+            frame.forEach(function (line) { yearly.set(line.year, line); });
+            var lastYear = lastYearOf(frame);
+
+            function get(measure, year) {
+                return yearly.has(year) ? yearly.get(year)[measure] : 0;
+            }
+            // Mean GDP per capita over the rows of each year
+            function gdp(year) {
+                return yearly.has(year) ? yearly.get(year)['gdp_per_capita ($)'] / yearly.get(year).rows : NaN;
+            }
+
+            return {
+                'suicides': [get('suicides_no', lastYear), get('suicides_no', lastYear - 1)],
+                'population': [get('population', lastYear), get('population', lastYear - 1)],
+                'most_vulnerable_age': view.idx('suicides_100k_pop', 'age'),
+                'gdp': [gdp(lastYear), gdp(lastYear - 1)]
+            };
+        },
+
+        multiple: function (view) {
+            var frame = view.frame(['country', 'year']);
+            var lastYear = lastYearOf(frame);
+            var rates = view.frame(['country']);
+            var highest = view.idx('suicides_100k_pop', 'country');
+            var lowest = view.idx('suicides_100k_pop', 'country', true);
+
+            function rate(country) {
+                return rates.filter(function (line) { return line.country === country; })[0].suicides_100k_pop;
+            }
+
+            return {
+                'suicides': [sumWhere(frame, 'suicides_no', lastYear), sumWhere(frame, 'suicides_no', lastYear - 1)],
+                'highest': [highest, rate(highest)],
+                'lowest': [lowest, rate(lowest)],
+                'most_vulnerable_age': view.idx('suicides_100k_pop', 'age')
+            };
+        },
+
+        custom: function (view) {
+            var frame = view.frame(['country', 'year']);
+            var lastYear = lastYearOf(frame);
+            var highest = null;
+            frame.forEach(function (line) {
+                if (line.year === lastYear && (highest === null || line.suicides_100k_pop > highest.suicides_100k_pop)) {
+                    highest = line;
+                }
+            });
+
+            return {
+                'suicides': [sumWhere(frame, 'suicides_no', lastYear), sumWhere(frame, 'suicides_no', lastYear - 1)],
+                'highest': [highest.country, highest.suicides_100k_pop],
+                'most_vulnerable_age': view.idx('suicides_100k_pop', 'age'),
+                'most_vulnerable_generation': view.idx('suicides_100k_pop', 'generation')
+            };
+        }
+    };
+
+    // Store callback of a page: (country or list of countries, year range,
+    // sex) -> payload
+    function store(page) {
+        return function () {
+            var args = Array.prototype.slice.call(arguments);
+            var sex = args.pop();
+            var yearRange = args.pop();
+            return load().then(function (bundle) {
+                var payload = {
+                    'countries': [].concat.apply([], args),
+                    'year_range': [Number(yearRange[0]), Number(yearRange[1])],
+                    'sex': sex
+                };
+                var view = viewOf(bundle, payload);
+                payload.metrics = view.hasRows() ? METRICS[page](view) : null;
+                return payload;
+            });
+        };
+    }
+
+    function viewOf(bundle, data) {
+        return new View(bundle, resolve(bundle, data.countries, data.year_range), data.sex);
+    }
+
+    // Graph callback: (store payload, ...states) -> figures
+    function graphs(render) {
+        return function (data) {
+            if (!data) {
+                // The store starts empty until its callback fills it
+                prevent();
+            }
+            var states = Array.prototype.slice.call(arguments, 1);
+            return load().then(function (bundle) {
+                return render.apply(null, [bundle, viewOf(bundle, data)].concat(states));
+            });
+        };
+    }
+
+    function comparisonTraces(bundle, view, comparison) {
+        if (comparison === 'suicides_100k_pop') {
+            return lineTraces(bundle, view.frame(['year', 'country']), 'year', 'suicides_100k_pop', 'country');
+        } else if (comparison === 'generation') {
+            return barTraces(bundle, view.frame(['country', 'generation']), 'suicides_no', 'generation', 'country');
+        } else if (comparison === 'gdp_per_capita ($)') {
+            return lineTraces(bundle, view.frame(['year', 'country']), 'year', 'gdp_per_capita ($)', 'country');
+        } else if (comparison === 'age') {
+            return polarTraces(bundle, byAge(view.frame(['country', 'age'])), 'suicides_no', 'age', 'country');
+        } else if (comparison === 'suicides_dist') {
+            return boxTraces(bundle, view.frame(['year', 'country']), 'country', 'suicides_no');
+        }
+        return [];
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        bundle: {
+            page_heading: function (pathname) {
+                if (pathname === '/custom-comparison') {
+                    return 'Custom comparisons';
+                } else if (pathname === '/compare-countries') {
+                    return 'Cross-Country Comparisons';
+                } else if (pathname === '/all-countries') {
+                    return 'All countries';
+                }
+                return 'Stats for a country';
+            },
+
+            single_store: store('single'),
+
+            single_general: graphs(function (bundle, view, general) {
+                return [figure(general.layout, lineTraces(bundle, view.frame(['year', 'country']), 'year', 'suicides_100k_pop', 'country'))];
+            }),
+
+            single_pies: graphs(function (bundle, view) {
+                var frame = view.frame(['country', 'age']);
+                return view.countries.map(function (country) {
+                    return agePie(bundle, frame.filter(function (line) { return line.country === country; }), country);
+                });
+            }),
+
+            multiple_store: store('multiple'),
+
+            multiple_general: graphs(function (bundle, view, general, age) {
+                return [
+                    figure(general.layout, lineTraces(bundle, view.frame(['year', 'country']), 'year', 'suicides_100k_pop', 'country')),
+                    figure(age.layout, polarTraces(bundle, byAge(view.frame(['country', 'age'])), 'suicides_no', 'age', 'country'))
+                ];
+            }),
+
+            multiple_world: function () {
+                return load().then(function (bundle) {
+                    return [bundle.figures.world];
+                });
+            },
+
+            all_countries: function (countries, yearRange, sex, detail, fig, budget) {
+                return load().then(function (bundle) {
+                    var series = overviewSeries(bundle, countries, yearRange, sex);
+                    var how = overviewFit(series.values, detail, budget);
+                    var traces;
+                    if (how === 'bands') {
+                        traces = bandTraces(bundle, series.years, series.values, OVERVIEW_MEASURE);
+                    } else if (how === 'packed') {
+                        traces = packedLineTraces(bundle, series.names, series.years, series.values, OVERVIEW_MEASURE);
+                    } else {
+                        traces = glLineTraces(bundle, series.names, series.years, series.values, OVERVIEW_MEASURE);
+                    }
+                    return [
+                        figure(fig.layout, traces),
+                        overviewSummary(series.names.length, overviewPoints(series.values), how, budget)
+                    ];
+                });
+            },
+
+            custom_store: store('custom'),
+
+            custom_general: function (data, comparison, layouts) {
+                return graphs(function (bundle, view) {
+                    return [figure(layouts[comparison], comparisonTraces(bundle, view, comparison))];
+                })(data);
+            }
+        }
+    });
+})();
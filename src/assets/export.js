@@ -0,0 +1,31 @@
+// Download links of the pages (see core/export.py).
+//
+// The links point at `/export` with the page's current selection, so the
+// browser downloads the file straight from the server, which streams it.
+// The query string is the one `core.export.parse` reads.
+
+(function () {
+    function prefix() {
+        var config = JSON.parse(document.getElementById('_dash-config').textContent);
+        return config.requests_pathname_prefix;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        export: {
+            // (country or list of countries, year range, sex, {formats, clamp})
+            // -> one URL per format
+            links: function (countries, yearRange, sex, settings) {
+                var params = [].concat(countries || []).map(function (country) {
+                    return 'country=' + encodeURIComponent(country);
+                });
+                params.push('from=' + Number(yearRange[0]), 'to=' + Number(yearRange[1]), 'sex=' + encodeURIComponent(sex));
+                if (!settings.clamp) {
+                    params.push('clamp=0');
+                }
+                return settings.formats.map(function (format) {
+                    return prefix() + 'export?' + ['format=' + format].concat(params).join('&');
+                });
+            }
+        }
+    });
+})();
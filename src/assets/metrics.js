@@ -0,0 +1,104 @@
+// Clientside rendering of the metric cards.
+//
+// `update_data_store` ships the raw numbers behind every card in the store
+// payload (`data.metrics`); the functions below turn them into the
+// `↑x%`/`↓x%` texts and colours in the browser, so a page interaction costs
+// no server round trip for the metrics. The formatting follows what the
+// Python callbacks used to return: two-decimal rounding half to even, and
+// Python's spelling of floats ('3.0', 'nan', 'inf').
+
+(function () {
+    // JSON has no NaN: the server sends null for a missing value
+    function number(value) {
+        return value === null || value === undefined ? NaN : value;
+    }
+
+    // Round half to even, like `numpy.round`
+    function round(value, decimals) {
+        var scale = Math.pow(10, decimals || 0);
+        var scaled = value * scale;
+        var rounded = Math.round(scaled);
+        if (rounded - scaled === 0.5 && rounded % 2 !== 0) {
+            rounded -= 1;
+        }
+        return rounded / scale;
+    }
+
+    // `str(float)` in Python
+    function pyFloat(value) {
+        if (Number.isNaN(value)) {
+            return 'nan';
+        }
+        if (!Number.isFinite(value)) {
+            return value > 0 ? 'inf' : '-inf';
+        }
+        if (Object.is(value, -0)) {
+            return '-0.0';
+        }
+        return Number.isInteger(value) ? value.toFixed(1) : String(value);
+    }
+
+    // Text and style of a percent change between [last, previous] values;
+    // `rising` is the colour of an increase, `falling` of anything else
+    function change(values, rising, falling) {
+        var last = number(values[0]);
+        var previous = number(values[1]);
+        var percent = round((last - previous) / previous * 100, 2);
+        if (percent > 0) {
+            return ['↑' + pyFloat(percent) + '%', {'color': rising}];
+        }
+        return ['↓' + pyFloat(-percent) + '%', {'color': falling}];
+    }
+
+    // Empty store, or nothing selected has any data: the cards say so
+    // rather than keep the numbers of the previous selection
+    var BLANK = 'n/a';
+    var NO_CHANGE = ['', {}];
+
+    function hasMetrics(data) {
+        return Boolean(data && data.metrics);
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        metrics: {
+            single: function (data) {
+                if (!hasMetrics(data)) {
+                    return [].concat([BLANK], NO_CHANGE, [BLANK], NO_CHANGE, [BLANK], [BLANK], NO_CHANGE);
+                }
+                var metrics = data.metrics;
+                return [].concat(
+                    [metrics.suicides[0]], change(metrics.suicides, 'red', 'green'),
+                    [metrics.population[0]], change(metrics.population, 'red', 'green'),
+                    [metrics.most_vulnerable_age],
+                    ['$' + round(metrics.gdp[0])], change(metrics.gdp, 'green', 'red')
+                );
+            },
+
+            multiple: function (data) {
+                if (!hasMetrics(data)) {
+                    return [].concat([BLANK], NO_CHANGE, [BLANK, ''], [BLANK, ''], [BLANK]);
+                }
+                var metrics = data.metrics;
+                return [].concat(
+                    [metrics.suicides[0]], change(metrics.suicides, 'red', 'green'),
+                    [metrics.highest[0], round(metrics.highest[1], 2)],
+                    [metrics.lowest[0], round(metrics.lowest[1], 2)],
+                    [metrics.most_vulnerable_age]
+                );
+            },
+
+            custom: function (data) {
+                if (!hasMetrics(data)) {
+                    return [].concat([BLANK], NO_CHANGE, [BLANK, ''], [BLANK], [BLANK]);
+                }
+                var metrics = data.metrics;
+                return [].concat(
+                    [metrics.suicides[0]], change(metrics.suicides, 'red', 'green'),
+                    metrics.highest,
+                    [metrics.most_vulnerable_age],
+                    [metrics.most_vulnerable_generation]
+                );
+            }
+        }
+    });
+})();
@@ -1,16 +0,0 @@
-// alert('If you see this alert, then your custom JavaScript script has run!')
-
-// eles = document.querySelectorAll('.metric-change')
-
-// for (let i = 0; i < eles.length; i++) {
-//     ele = eles[i]
-//     print(ele)
-//     // change color of ele when value updates by adding an event listener
-//     ele.addEventListener('DOMSubtreeModified', function () {
-//         if (ele.innerHTML.includes('-')) {
-//             ele.style.color = 'red'
-//         } else {
-//             ele.style.color = 'green'
-//         }
-//     })
-// }
\ No newline at end of file
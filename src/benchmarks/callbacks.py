@@ -0,0 +1,243 @@
+"""Benchmark of the page callbacks over the whole selection space.
+
+Imports the app (which registers the pages) without starting a server and
+calls each server-side callback directly, over every country, a few year
+ranges and every sex option. Multi-country pages get the countries in
+consecutive groups (`--group-size`), so every country is part of some
+selection.
+
+Each callback is timed call by call and its output is serialized the way
+Dash sends it to measure the payload, and gzipped the way the server
+compresses it (see `core.transport`); a second pass runs a sample of the
+calls under `tracemalloc` for their peak allocation. By default every cache
+is cleared before each call, which is the cost of a selection a worker has
+not seen yet; `--warm` runs the grid once to fill the caches and measures
+the second pass.
+
+The report is written as JSON so runs can be compared:
+
+    python -m benchmarks.callbacks [--warm] [--countries N] [--output run.json] [--baseline old.json]
+
+Only the bundled dataset is read; nothing touches the network.
+"""
+import argparse
+import datetime
+import gzip
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+SEXES = ('both', 'male', 'female')
+
+
+def year_ranges(first, last):
+    """A handful of ranges from the whole dataset down to a single year."""
+    ranges = {
+        (first, last),
+        (max(1988, first), min(2017, last)),  # the pages' default
+        (max(first, last - 4), last),
+        (first, min(last, first + 9)),
+        ((first + last) // 2, (first + last) // 2),
+    }
+    return sorted([list(years) for years in ranges])
+
+
+def groups(countries, size):
+    """Consecutive groups of `size` countries, wrapping around at the end."""
+    return [[countries[(i + j) % len(countries)] for j in range(size)] for i in range(0, len(countries), size)]
+
+
+def load_pages():
+    # Importing the app registers the pages without starting a server
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        import app  # noqa: F401
+        from pages import custom_comparison, multiple_country, single_country
+    return single_country, multiple_country, custom_comparison
+
+
+def build_calls(single, multiple, custom, n_countries=None, group_size=None):
+    """List of `(callback name, function, argument thunk)` to benchmark.
+
+    The other callbacks get the output of the page's `update_data_store`, as
+    Dash hands it to them. It is computed once per selection, outside the
+    measured region. The comparison pages get groups of `group_size`
+    countries, by default as many as they start with.
+    """
+    from core import dataset
+
+    countries = dataset.get_index().countries[:n_countries]
+    df = dataset.get_df()
+    ranges = year_ranges(int(df.year.min()), int(df.year.max()))
+    payloads = {}
+
+    def stored(page, selection):
+        def make_args():
+            key = (page.__name__, json.dumps(selection))
+            if key not in payloads:
+                payloads[key] = json.loads(payload_json(page.update_data_store(*selection)))
+            return (payloads[key],)
+        return make_args
+
+    calls = []
+    for page, selections in (
+        (single, [(country, years, sex) for country in countries for years in ranges for sex in SEXES]),
+        (multiple, [(group, years, sex) for group in groups(countries, group_size or 4) for years in ranges for sex in SEXES]),
+        (custom, [(group, years, sex) for group in groups(countries, group_size or 2) for years in ranges for sex in SEXES]),
+    ):
+        name = page.__name__.rsplit('.', 1)[-1]
+        for selection in selections:
+            calls.append((f'{name}.update_data_store', page.update_data_store, lambda s=selection: s))
+            if page is custom:
+                data = stored(page, selection)
+                for comparison in custom.COMPARISON_CHARTS:
+                    calls.append((f'{name}.comparison_traces', custom.comparison_traces,
+                                  lambda data=data, comparison=comparison: data() + (comparison,)))
+            else:
+                calls.append((f'{name}.render_general_graphs', page.render_general_graphs, stored(page, selection)))
+            if page is single:
+                calls.append((f'{name}.render_pie_charts', page.render_pie_charts, stored(page, selection)))
+    # The world charts do not depend on the selection; repeat them for a spread
+    for _ in range(20):
+        calls.append(('multiple_country.render_world_charts', multiple.render_world_charts,
+                      lambda: ('results-world1',)))
+    return calls
+
+
+def clear_caches():
+    from core import cache
+    for lru in cache.registry.values():
+        lru.clear()
+
+
+def payload_json(output):
+    # Dash serializes callback outputs the same way
+    from plotly.io.json import to_json_plotly
+    return to_json_plotly(output)
+
+
+def run(calls, warm=False, allocations=1):
+    """Samples per callback name; `allocations` traces one call in that many."""
+    from core import transport
+
+    samples = {}
+
+    def measure(record, every=1):
+        for i, (name, func, make_args) in enumerate(calls):
+            if i % every:
+                continue
+            args = make_args()
+            if not warm:
+                clear_caches()
+            record(samples.setdefault(name, {}), func, args)
+
+    def timed(sample, func, args):
+        start = time.perf_counter()
+        output = func(*args)
+        sample.setdefault('latency_ms', []).append((time.perf_counter() - start) * 1e3)
+        payload = payload_json(output).encode()
+        sample.setdefault('payload_bytes', []).append(len(payload))
+        sample.setdefault('gzip_bytes', []).append(len(gzip.compress(payload, transport.GZIP_LEVEL, mtime=0)))
+
+    def traced(sample, func, args):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        func(*args)
+        sample.setdefault('peak_alloc_bytes', []).append(tracemalloc.get_traced_memory()[1] - before)
+
+    if warm:
+        measure(lambda sample, func, args: func(*args))
+        samples.clear()
+    measure(timed)
+    if allocations:
+        # tracemalloc slows every allocation down, so it gets its own pass
+        tracemalloc.start()
+        try:
+            measure(traced, every=allocations)
+        finally:
+            tracemalloc.stop()
+    return samples
+
+
+def summarize(values):
+    values = np.asarray(values, dtype=float)
+    summary = {f'p{p}': round(float(np.percentile(values, p)), 3) for p in PERCENTILES}
+    summary.update(mean=round(float(values.mean()), 3), max=round(float(values.max()), 3))
+    return summary
+
+
+def report(samples, warm):
+    import dash
+    import pandas as pd
+    from core import dataset
+
+    return {
+        'meta': {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'mode': 'warm' if warm else 'cold',
+            'dataset_version': dataset.version(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'dash': dash.__version__,
+            'machine': platform.machine(),
+        },
+        'callbacks': {
+            name: {'calls': len(sample['latency_ms']), **{metric: summarize(values) for metric, values in sample.items()}}
+            for name, sample in sorted(samples.items())
+        },
+    }
+
+
+def print_report(result, baseline=None):
+    rows = []
+    for name, stats in result['callbacks'].items():
+        latency = stats['latency_ms']
+        line = (f"{name:<42} {stats['calls']:>6} {latency['p50']:>9.2f} {latency['p95']:>9.2f} {latency['p99']:>9.2f}"
+                f" {stats['payload_bytes']['p50']:>10.0f} {stats.get('gzip_bytes', {}).get('p50', 0):>10.0f}")
+        if 'peak_alloc_bytes' in stats:
+            line += f" {stats['peak_alloc_bytes']['p50'] / 1024:>10.1f}"
+        old = (baseline or {}).get('callbacks', {}).get(name)
+        if old:
+            change = latency['p50'] / old['latency_ms']['p50'] - 1 if old['latency_ms']['p50'] else 0
+            line += f'  p50 {change:+.0%} vs baseline'
+        rows.append(line)
+    print(f"{'callback':<42} {'calls':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'bytes p50':>10} {'gzip p50':>10} {'peak KiB':>10}")
+    print('\n'.join(rows))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--warm', action='store_true', help='measure with the caches filled by a first pass')
+    parser.add_argument('--allocations', type=int, default=5, metavar='N',
+                        help='trace the allocations of one call in N (default 5, 0 to skip)')
+    parser.add_argument('--countries', type=int, metavar='N', help='only use the first N countries')
+    parser.add_argument('--group-size', type=int, metavar='N',
+                        help='countries per selection of the comparison pages (default: their initial 4 and 2)')
+    parser.add_argument('--output', help='where to write the JSON report (default: bench-<mode>-<time>.json)')
+    parser.add_argument('--baseline', help='earlier JSON report to compare p50 latencies with')
+    args = parser.parse_args(argv)
+
+    calls = build_calls(*load_pages(), n_countries=args.countries, group_size=args.group_size)
+    result = report(run(calls, warm=args.warm, allocations=args.allocations), args.warm)
+
+    output = args.output or f"bench-{result['meta']['mode']}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    print(f'Wrote {output}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,536 @@
+"""Concurrent load test of the dashboard over HTTP.
+
+Virtual users browse a running app the way dash-renderer does: a page load
+fetches the page, `/_dash-layout` and `/_dash-dependencies`, then POSTs to
+`/_dash-update-component` for every server callback the new components
+trigger, feeding each response into the callbacks that depend on it. After
+that each user changes a dropdown, drags a year slider through a few
+positions (one callback chain per release, as with the default
+`updatemode='mouseup'`) and flips a radio button, then loads another page.
+Component ids, options and links are read from the layouts the server
+returns, so the scenarios follow the pages as they change. Clientside
+callbacks are skipped, the browser runs them; static assets are not fetched.
+
+Users run as threads or as asyncio tasks and report latency, throughput and
+error rate per callback and per sequence:
+
+    python -m benchmarks.load --users 16 --duration 60 [--url http://127.0.0.1:8050]
+    python -m benchmarks.load --workers 4 --threads 2 --users 32 [--mode asyncio] [--output load.json]
+
+With `--workers` a gunicorn server is started on a free local port for the
+run, which makes it easy to compare worker and thread counts. Only the
+standard library is used on the client side.
+"""
+import argparse
+import asyncio
+import collections
+import datetime
+import gzip
+import http.client
+import json
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from pathlib import Path
+
+from benchmarks.callbacks import summarize
+
+SRC_DIR = Path(__file__).resolve().parent.parent
+
+# What a user script yields: an HTTP request to make, or a pause
+Request = collections.namedtuple('Request', 'label method path body')
+Pause = collections.namedtuple('Pause', 'seconds')
+
+# Sent back for a request that did not get a response at all
+NO_RESPONSE = (0, b'')
+# Asked for like a browser does, so the server's compression is measured
+ACCEPT_ENCODING = 'gzip'
+
+
+class Callback:
+    """A server callback as listed by `/_dash-dependencies`."""
+
+    def __init__(self, spec):
+        self.output = spec['output']
+        self.multi = self.output.startswith('..')
+        keys = self.output[2:-2].split('...') if self.multi else [self.output]
+        self.outputs = [dict(zip(('id', 'property'), key.rsplit('.', 1))) for key in keys]
+        self.inputs = spec['inputs']
+        self.state = spec['state']
+        self.initial = not spec['prevent_initial_call']
+        self.input_keys = {_key(i) for i in self.inputs}
+        self.output_keys = set(keys)
+        self.ids = {i['id'] for i in self.inputs + self.state}
+        self.label = keys[0] if len(keys) == 1 else f'{keys[0]} (+{len(keys) - 1})'
+
+    def body(self, props, changed):
+        def values(deps):
+            return [{**dep, 'value': props[dep['id']].get(dep['property'])} for dep in deps]
+        return {
+            'output': self.output,
+            'outputs': self.outputs if self.multi else self.outputs[0],
+            'inputs': values(self.inputs),
+            'changedPropIds': sorted(changed),
+            'state': values(self.state),
+        }
+
+
+def _key(dep):
+    return f"{dep['id']}.{dep['property']}"
+
+
+class Session:
+    """One browser tab: the props of the components it shows and the callbacks it fires.
+
+    Its methods are generators that yield `Request`s and get `(status, body)`
+    back, so the same session runs under threads or asyncio.
+    """
+
+    def __init__(self, prefix, stats):
+        self.prefix = prefix
+        self.stats = stats
+        self.props = {}
+        self.types = {}
+        self.subtrees = {}
+        self.callbacks = []
+        self.paths = []
+        self.errors = 0
+
+    def _request(self, label, method, path, body=None):
+        status, data = yield Request(label, method, self.prefix + path, body)
+        if not 200 <= status < 300:
+            self.errors += 1
+        return status, data
+
+    def _get_json(self, path):
+        status, data = yield from self._request(f'GET {path}', 'GET', path)
+        return json.loads(data) if status == 200 else None
+
+    def _mount(self, tree):
+        """Record the components with an id in `tree`; return their ids."""
+        ids = set()
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, list):
+                stack.extend(node)
+                continue
+            if not isinstance(node, dict) or 'props' not in node:
+                continue
+            props = node['props']
+            if isinstance(props.get('id'), str):
+                self.props[props['id']] = props
+                self.types[props['id']] = node.get('type')
+                ids.add(props['id'])
+            if node.get('type') == 'Link' and props.get('href', '').startswith('/'):
+                self.paths.append(props['href'])
+            stack.extend(value for value in props.values() if isinstance(value, (dict, list)))
+        return ids
+
+    def _unmount(self, ids):
+        for component_id in ids:
+            self.props.pop(component_id, None)
+            self.types.pop(component_id, None)
+            self._unmount(self.subtrees.pop(component_id, ()))
+
+    def _apply(self, response):
+        """Store a callback response; return the changed props and the new components."""
+        changed, mounted = set(), set()
+        for component_id, values in response.items():
+            props = self.props.get(component_id)
+            if props is None:
+                continue
+            for prop, value in values.items():
+                changed.add(f'{component_id}.{prop}')
+                if isinstance(value, dict) and '__dash_patch_update' in value:
+                    # Patched figures are not read back by any server callback
+                    continue
+                if prop == 'children':
+                    self._unmount(self.subtrees.pop(component_id, ()))
+                    self.subtrees[component_id] = self._mount(value)
+                    mounted |= self.subtrees[component_id]
+                props[prop] = value
+        return changed, mounted
+
+    def _fire(self, changed, mounted=()):
+        """Run the callbacks `changed` props trigger, then the ones they trigger in turn.
+
+        Like dash-renderer, a callback waits while another pending callback
+        still has to produce one of its inputs, and components that appear
+        get their initial callbacks.
+        """
+        pending = {}
+
+        def trigger(changed, mounted):
+            for callback in self.callbacks:
+                keys = callback.input_keys & changed
+                if keys or (callback.initial and callback.ids & mounted):
+                    pending.setdefault(callback, set()).update(keys)
+
+        trigger(changed, set(mounted))
+        while pending:
+            waiting = set().union(*(c.output_keys for c in pending))
+            callback = next((c for c in pending if not c.input_keys & (waiting - c.output_keys)), next(iter(pending)))
+            keys = pending.pop(callback)
+            if not all(component_id in self.props for component_id in callback.ids):
+                continue
+            body = json.dumps(callback.body(self.props, keys))
+            status, data = yield from self._request(callback.label, 'POST', '/_dash-update-component', body)
+            if status == 200:
+                trigger(*self._apply(json.loads(data).get('response', {})))
+
+    def load(self, path):
+        """Full page load of `path`."""
+        yield from self._request(f'GET {path}', 'GET', path)
+        layout = yield from self._get_json('/_dash-layout')
+        dependencies = yield from self._get_json('/_dash-dependencies')
+        if layout is None or dependencies is None:
+            return
+        self.props, self.types, self.subtrees, self.paths = {}, {}, {}, []
+        self.callbacks = [Callback(spec) for spec in dependencies if not spec.get('clientside_function')]
+        mounted = self._mount(layout)
+        # Location components report the URL once they are mounted
+        changed = set()
+        for component_id, component_type in self.types.items():
+            if component_type == 'Location':
+                self.props[component_id].update(pathname=path, search='')
+                changed |= {f'{component_id}.pathname', f'{component_id}.search'}
+        yield from self._fire(changed, mounted)
+
+    def _controls(self, component_type):
+        # Only the components a server callback listens to
+        listened = set().union(*(c.input_keys for c in self.callbacks))
+        return sorted(i for i, t in self.types.items() if t == component_type and f'{i}.value' in listened)
+
+    def _set(self, component_id, value):
+        self.props[component_id]['value'] = value
+        yield from self._fire({f'{component_id}.value'})
+
+    def pick_option(self, component_type, rng):
+        """Choose another option of one of the `component_type` controls."""
+        controls = self._controls(component_type)
+        if not controls:
+            return
+        component_id = rng.choice(controls)
+        props = self.props[component_id]
+        options = [o['value'] if isinstance(o, dict) else o for o in props.get('options', [])]
+        options = [o for o in options if o != props.get('value')] or options
+        if options:
+            value = rng.choice(options)
+            yield from self._set(component_id, [value] if props.get('multi') else value)
+
+    def drag_slider(self, rng, steps):
+        """Move one handle of a range slider to a new position, releasing it `steps` times on the way."""
+        controls = self._controls('RangeSlider')
+        if not controls:
+            return
+        component_id = rng.choice(controls)
+        props = self.props[component_id]
+        low, high = props.get('value') or [props['min'], props['max']]
+        if rng.random() < 0.5:
+            positions = _positions(low, rng.randint(props['min'], high), steps)
+            values = [[position, high] for position in positions]
+        else:
+            positions = _positions(high, rng.randint(low, props['max']), steps)
+            values = [[low, position] for position in positions]
+        for value in values:
+            yield from self._set(component_id, value)
+
+
+def _positions(start, end, steps):
+    # Evenly spaced stops after `start`, ending at `end`
+    positions = []
+    for i in range(1, steps + 1):
+        position = round(start + (end - start) * i / steps)
+        if position != (positions[-1] if positions else start):
+            positions.append(position)
+    return positions
+
+
+def browse(session, rng, drag_steps=5, think=0):
+    """Script of a virtual user: load a page, use its controls, load another one."""
+    sequences = (
+        ('page load', lambda: session.load(rng.choice(session.paths or ['/']))),
+        ('dropdown change', lambda: session.pick_option('Dropdown', rng)),
+        ('slider drag', lambda: session.drag_slider(rng, drag_steps)),
+        ('radio change', lambda: session.pick_option('RadioItems', rng)),
+    )
+    while True:
+        for name, sequence in sequences:
+            errors, started = session.errors, time.monotonic()
+            yield from sequence()
+            session.stats.record(f'[{name}]', started, time.monotonic() - started, session.errors == errors)
+            if think:
+                yield Pause(rng.expovariate(1 / think))
+
+
+class Stats:
+    """Latencies and failures per label, for requests started in the measurement window."""
+
+    def __init__(self, start):
+        self.start = start
+        self.samples = collections.defaultdict(list)
+        self.errors = collections.Counter()
+        self._lock = threading.Lock()
+
+    def record(self, label, started, seconds, ok):
+        if started < self.start:
+            return
+        with self._lock:
+            self.samples[label].append(seconds * 1e3)
+            self.errors[label] += not ok
+
+    def report(self, seconds):
+        def entry(latencies, errors):
+            return {
+                'requests': len(latencies),
+                'errors': errors,
+                'error_rate': round(errors / len(latencies), 4),
+                'throughput_rps': round(len(latencies) / seconds, 2),
+                'latency_ms': summarize(latencies),
+            }
+
+        requests = [label for label in self.samples if not label.startswith('[')]
+        everything = [ms for label in requests for ms in self.samples[label]]
+        return {
+            'total': entry(everything, sum(self.errors[label] for label in requests)) if everything else None,
+            'callbacks': {label: entry(self.samples[label], self.errors[label]) for label in sorted(self.samples)},
+        }
+
+
+def _decode(data, encoding):
+    return gzip.decompress(data) if encoding == 'gzip' else data
+
+
+class ThreadClient:
+    """Keep-alive HTTP connection for one thread."""
+
+    def __init__(self, host, port, timeout):
+        self.connection = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def request(self, request):
+        headers = {'Accept-Encoding': ACCEPT_ENCODING}
+        if request.body is not None:
+            headers['Content-Type'] = 'application/json'
+        for attempt in (1, 2):
+            try:
+                self.connection.request(request.method, request.path, body=request.body, headers=headers)
+                response = self.connection.getresponse()
+                return response.status, _decode(response.read(), response.getheader('Content-Encoding'))
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # The server dropped an idle keep-alive connection: retry once
+                self.connection.close()
+                if attempt == 2:
+                    return NO_RESPONSE
+            except (OSError, http.client.HTTPException):
+                self.connection.close()
+                return NO_RESPONSE
+
+    def close(self):
+        self.connection.close()
+
+
+class AsyncClient:
+    """Minimal keep-alive HTTP/1.1 client on asyncio streams."""
+
+    def __init__(self, host, port, timeout):
+        self.host, self.port, self.timeout = host, port, timeout
+        self.reader = self.writer = None
+
+    async def request(self, request):
+        for attempt in (1, 2):
+            reused = self.writer is not None
+            try:
+                return await asyncio.wait_for(self._exchange(request), self.timeout)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+                self.close()
+                if not reused or attempt == 2:
+                    return NO_RESPONSE
+
+    async def _exchange(self, request):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = (request.body or '').encode()
+        head = [f'{request.method} {request.path} HTTP/1.1', f'Host: {self.host}:{self.port}',
+                f'Content-Length: {len(body)}', f'Accept-Encoding: {ACCEPT_ENCODING}']
+        if request.body is not None:
+            head.append('Content-Type: application/json')
+        self.writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while (line := await self.reader.readline()) not in (b'\r\n', b'\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while size := int((await self.reader.readline()).split(b';')[0], 16):
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            await self.reader.readline()
+            data = b''.join(chunks)
+        elif 'content-length' in headers:
+            data = await self.reader.readexactly(int(headers['content-length']))
+        else:
+            data = await self.reader.read()
+            headers['connection'] = 'close'
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, _decode(data, headers.get('content-encoding'))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+def run_threads(url, users, deadline, stats, options):
+    def user(n):
+        client = ThreadClient(url.hostname, url.port or 80, options.timeout)
+        script = browse(Session(url.path.rstrip('/'), stats), random.Random(options.seed + n),
+                        options.drag_steps, options.think)
+        event = next(script)
+        while time.monotonic() < deadline:
+            if isinstance(event, Pause):
+                time.sleep(min(event.seconds, max(0, deadline - time.monotonic())))
+                event = next(script)
+                continue
+            started = time.monotonic()
+            status, data = client.request(event)
+            stats.record(event.label, started, time.monotonic() - started, 200 <= status < 300)
+            event = script.send((status, data))
+        client.close()
+
+    threads = [threading.Thread(target=user, args=(n,), daemon=True) for n in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_asyncio(url, users, deadline, stats, options):
+    async def user(n):
+        client = AsyncClient(url.hostname, url.port or 80, options.timeout)
+        script = browse(Session(url.path.rstrip('/'), stats), random.Random(options.seed + n),
+                        options.drag_steps, options.think)
+        event = next(script)
+        while time.monotonic() < deadline:
+            if isinstance(event, Pause):
+                await asyncio.sleep(min(event.seconds, max(0, deadline - time.monotonic())))
+                event = next(script)
+                continue
+            started = time.monotonic()
+            status, data = await client.request(event)
+            stats.record(event.label, started, time.monotonic() - started, 200 <= status < 300)
+            event = script.send((status, data))
+        client.close()
+
+    async def main():
+        await asyncio.gather(*(user(n) for n in range(users)))
+
+    asyncio.run(main())
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers, threads, timeout=120):
+    """Start gunicorn on a free local port; return the process and its URL once it answers.
+
+    It runs from `src`, so it uses the production settings of gunicorn.conf.py.
+    """
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+         '--threads', str(threads), '--log-level', 'warning', 'app:server'],
+        cwd=SRC_DIR,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with status {process.returncode}')
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/_dash-layout')
+            if connection.getresponse().status == 200:
+                return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f'gunicorn did not answer within {timeout} s')
+
+
+def print_report(result):
+    print(f"{'callback / [sequence]':<44} {'requests':>8} {'errors':>7} {'req/s':>8}"
+          f" {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    rows = list(result['callbacks'].items())
+    if result['total']:
+        rows.append(('total', result['total']))
+    for label, stats in rows:
+        latency = stats['latency_ms']
+        print(f"{label:<44} {stats['requests']:>8} {stats['error_rate']:>7.1%} {stats['throughput_rps']:>8.1f}"
+              f" {latency['p50']:>9.1f} {latency['p95']:>9.1f} {latency['p99']:>9.1f} {latency['max']:>9.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8050', help='app to load (default %(default)s)')
+    parser.add_argument('--workers', type=int, help='start gunicorn with this many workers instead of using --url')
+    parser.add_argument('--threads', type=int, default=1, help='threads per gunicorn worker (default 1)')
+    parser.add_argument('--users', type=int, default=8, help='concurrent virtual users (default 8)')
+    parser.add_argument('--mode', choices=('threads', 'asyncio'), default='threads', help='how users are run')
+    parser.add_argument('--duration', type=float, default=30, help='seconds measured (default 30)')
+    parser.add_argument('--warmup', type=float, default=5, help='seconds run before measuring (default 5)')
+    parser.add_argument('--think', type=float, default=0,
+                        help='mean pause in seconds between sequences (default 0, back to back)')
+    parser.add_argument('--drag-steps', type=int, default=5, help='slider releases per drag (default 5)')
+    parser.add_argument('--timeout', type=float, default=30, help='seconds before a request fails (default 30)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the users\' random choices')
+    parser.add_argument('--output', help='also write the report as JSON')
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.workers:
+        server, args.url = start_server(args.workers, args.threads)
+    try:
+        url = urllib.parse.urlsplit(args.url)
+        start = time.monotonic() + args.warmup
+        stats = Stats(start)
+        runner = run_asyncio if args.mode == 'asyncio' else run_threads
+        runner(url, args.users, start + args.duration, stats, args)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    result = {
+        'meta': {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'url': args.url,
+            'workers': args.workers,
+            'threads': args.threads if args.workers else None,
+            'users': args.users,
+            'mode': args.mode,
+            'duration_s': args.duration,
+            'think_s': args.think,
+        },
+        **stats.report(args.duration),
+    }
+    print_report(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f'Wrote {args.output}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""Synthetic scale-up of the dataset, and what loading it costs.
+
+Writes a CSV with the schema of `master.csv` and `--factor` times its rows,
+standing in for sub-national data: every country gets `factor - 1` synthetic
+regions ("France (07)", ...) with the same years, sexes, ages and
+generations, their population scaled and their rates, suicides and GDP
+perturbed around the country's. Region 0 is the source itself. Each region
+is drawn from its own seeded generator and written as soon as it is made, so
+the output is the same for a given seed whatever the size, and memory stays
+at one region's rows:
+
+    python -m benchmarks.scale --factor 315 --output ../data/master-315x.csv [--seed 0] [--measure]
+
+`--measure` then builds the snapshot of the file and the index and cube over
+it in a fresh interpreter, as a worker does on start-up, and reports the
+time and peak memory of each step and the size of what was built
+(`--compare-eager` adds a whole-file `pd.read_csv` for comparison). Point
+`DASHBOARD_DATA_PATH` at the file to run the other benchmarks against it.
+"""
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import config
+from benchmarks.load import SRC_DIR
+from core import snapshot
+
+# Runs in the child interpreter; prints its measurements as JSON on the last line
+CHILD = '''
+import json, os, resource, time
+
+def peak_mb():
+    # Linux reports kilobytes
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def disk_mb(path):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files) / 2 ** 20
+
+phases = {{}}
+def phase(name, started):
+    phases[name] = {{'seconds': round(time.time() - started, 3), 'peak_rss_mb': round(peak_mb(), 1)}}
+
+started = time.time()
+import config
+from core import snapshot
+from core.cube import Cube
+from core.index import SelectionIndex
+phase('imports', started)
+sizes = {{}}
+if {eager}:
+    started = time.time()
+    df = snapshot.prepare(snapshot.read_source(config.DATA_PATH))
+    phase('eager read_csv and sort (comparison)', started)
+    del df
+else:
+    started = time.time()
+    manifest = snapshot.build()
+    phase('build snapshot (chunked)', started)
+    sizes['snapshot_mb'] = round(disk_mb(config.SNAPSHOT_DIR), 1)
+    started = time.time()
+    df = snapshot.load(manifest)
+    phase('map snapshot', started)
+    started = time.time()
+    index = SelectionIndex(df)
+    phase('build index', started)
+    sizes['index_mb'] = round((sum(k.nbytes for k in index._keys)
+                               + sum(y.nbytes for y in index._data_years.values())) / 2 ** 20, 1)
+    started = time.time()
+    cube = Cube(df)
+    phase('build cube', started)
+    sizes['cube_mb'] = round((cube.rows.nbytes + cube.generation.nbytes
+                              + sum(s.nbytes for s in cube.sums.values())) / 2 ** 20, 1)
+    sizes['rows'] = len(df)
+    sizes['countries'] = len(cube.labels['country'])
+print(json.dumps({{'phases': phases, 'sizes': sizes}}))
+'''
+
+
+def regions(source, factor, seed):
+    """Yield the source's rows for region 0, then each synthetic region's."""
+    countries = source['country'].astype('category')
+    codes, names = countries.cat.codes.to_numpy(), countries.cat.categories
+    width = len(str(max(factor - 1, 1)))
+    yield source
+    for region in range(1, factor):
+        rng = np.random.default_rng([seed, region])
+        # One size and one wealth factor per region of each country, and
+        # some noise on every rate
+        size = rng.lognormal(-1.5, 1.0, len(names))[codes]
+        wealth = rng.lognormal(0, 0.2, len(names))[codes]
+        noise = rng.lognormal(0, 0.15, len(source))
+
+        block = source.copy()
+        block['country'] = names[codes] + f' ({region:0{width}d})'
+        block['country-year'] = block['country'] + block['year'].astype(str)
+        block['population'] = np.maximum(np.round(source['population'].to_numpy() * size), 1).astype(np.int64)
+        block['suicides_100k_pop'] = np.round(source['suicides_100k_pop'].to_numpy() * noise, 2)
+        # A missing count stays missing
+        block['suicides_no'] = np.round(block['suicides_100k_pop'] * block['population'] / 1e5).where(
+            source['suicides_no'].notna())
+        block['gdp_per_capita ($)'] = np.round(source['gdp_per_capita ($)'].to_numpy() * wealth, 2)
+        block[' gdp_for_year ($) '] = np.round(source[' gdp_for_year ($) '].to_numpy() * size * wealth)
+        yield block
+
+
+def generate(output, factor, seed=0, source_path=None):
+    source = snapshot.read_source(source_path or config.DATA_PATH)
+    started = time.time()
+    rows = 0
+    with open(output, 'w', newline='') as f:
+        for i, block in enumerate(regions(source, factor, seed)):
+            block.to_csv(f, header=i == 0, index=False, lineterminator='\n')
+            rows += len(block)
+    return {
+        'output': str(output),
+        'factor': factor,
+        'seed': seed,
+        'rows': rows,
+        'size_mb': round(os.path.getsize(output) / 2 ** 20, 1),
+        'seconds': round(time.time() - started, 1),
+    }
+
+
+def measure(csv_path, eager=False):
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        env = dict(os.environ, DASHBOARD_DATA_PATH=str(os.path.abspath(csv_path)), DASHBOARD_SNAPSHOT_DIR=snapshot_dir)
+        child = subprocess.run([sys.executable, '-c', CHILD.format(eager=eager)],
+                               cwd=SRC_DIR, env=env, capture_output=True, text=True)
+    if child.returncode:
+        raise RuntimeError(f'measurement failed:\n{child.stderr[-2000:]}')
+    return json.loads(child.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    size = parser.add_mutually_exclusive_group(required=True)
+    size.add_argument('--factor', type=int, help='copies of every country (1 reproduces the source)')
+    size.add_argument('--rows', type=int, help='at least this many rows; sets the factor')
+    parser.add_argument('--output', required=True, help='CSV to write')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default 0)')
+    parser.add_argument('--source', help='CSV to scale (default: DASHBOARD_DATA_PATH)')
+    parser.add_argument('--measure', action='store_true', help='then measure loading the generated file')
+    parser.add_argument('--compare-eager', action='store_true', help='also measure a whole-file read_csv')
+    parser.add_argument('--report', help='write the results as JSON')
+    args = parser.parse_args(argv)
+
+    factor = args.factor
+    if factor is None:
+        factor = math.ceil(args.rows / len(snapshot.read_source(args.source or config.DATA_PATH)))
+    result = {'generated': generate(args.output, factor, args.seed, args.source)}
+    generated = result['generated']
+    print(f"Wrote {generated['rows']:,} rows ({generated['size_mb']} MB) to {generated['output']} "
+          f"in {generated['seconds']} s")
+
+    if args.measure or args.compare_eager:
+        result['chunk_rows'] = config.CHUNK_ROWS
+        result['load'] = measure(args.output)
+        if args.compare_eager:
+            result['eager'] = measure(args.output, eager=True)
+        print(f'\nLoading it (chunks of {config.CHUNK_ROWS:,} rows):')
+        for run in ('load', 'eager'):
+            for name, numbers in result.get(run, {}).get('phases', {}).items():
+                if name == 'imports' and run == 'eager':
+                    continue
+                print(f"  {name:<40} {numbers['seconds']:>8.2f} s   peak RSS {numbers['peak_rss_mb']:>8.1f} MB")
+        for name, value in result['load']['sizes'].items():
+            print(f'  {name:<40} {value:>8,}')
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f'Wrote {args.report}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
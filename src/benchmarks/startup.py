@@ -0,0 +1,149 @@
+"""Cold-start profile: import cost per module and time to the first page.
+
+Starts a fresh interpreter with `-X importtime`, the way a new worker or a
+freshly scaled-out instance starts, and in it loads the dataset, imports the
+app and serves a first page load through Flask's test client (the same
+requests `benchmarks.load` sends: the page, its layout, then every callback
+the page triggers, with cold caches). Reports the time of each phase, the
+requests of the first page load, and the modules and packages that cost the
+most to import:
+
+    python -m benchmarks.startup [--path /compare-countries] [--top 20] [--output startup.json]
+"""
+import argparse
+import collections
+import datetime
+import json
+import re
+import subprocess
+import sys
+import time
+
+from benchmarks.load import SRC_DIR
+
+# Runs in the child interpreter; prints its timings as JSON on the last line
+CHILD = '''
+import json, time
+started = time.time()
+
+from core import dataset
+imported_dataset = time.time()
+dataset.get_cube()
+loaded = time.time()
+
+import app
+imported_app = time.time()
+
+from benchmarks.load import Session, Stats
+client = app.server.test_client()
+requests = []
+script = Session('', Stats(0)).load({path!r})
+request = next(script)
+try:
+    while True:
+        start = time.time()
+        if request.method == 'GET':
+            response = client.get(request.path)
+        else:
+            response = client.post(request.path, data=request.body, content_type='application/json')
+        requests.append({{'label': request.label, 'status': response.status_code, 'at': start,
+                          'ms': (time.time() - start) * 1e3}})
+        request = script.send((response.status_code, response.get_data()))
+except StopIteration:
+    pass
+
+print(json.dumps({{
+    'started': started, 'imported_dataset': imported_dataset, 'loaded': loaded,
+    'imported_app': imported_app, 'served': time.time(), 'requests': requests,
+}}))
+'''
+
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)')
+
+
+def parse_importtime(stderr):
+    """`(module, self µs, cumulative µs, depth)` for every module imported."""
+    modules = []
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return modules
+
+
+def profile(path='/'):
+    launched = time.time()
+    child = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD.format(path=path)],
+        cwd=SRC_DIR, capture_output=True, text=True,
+    )
+    if child.returncode:
+        raise RuntimeError(f'startup failed:\n{child.stderr[-2000:]}')
+    timings = json.loads(child.stdout.strip().splitlines()[-1])
+    modules = parse_importtime(child.stderr)
+
+    first = timings['requests'][0] if timings['requests'] else None
+    phases = {
+        'interpreter': timings['started'] - launched,
+        'import core.dataset': timings['imported_dataset'] - timings['started'],
+        'load dataset': timings['loaded'] - timings['imported_dataset'],
+        'import app and pages': timings['imported_app'] - timings['loaded'],
+        'first page load': timings['served'] - timings['imported_app'],
+    }
+    packages = collections.Counter()
+    for name, self_us, _, _ in modules:
+        packages[name.split('.')[0]] += self_us
+    return {
+        'meta': {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'path': path,
+            'python': sys.version.split()[0],
+        },
+        'phases_ms': {name: round(seconds * 1e3, 1) for name, seconds in phases.items()},
+        'time_to_first_response_ms': round((first['at'] + first['ms'] / 1e3 - launched) * 1e3, 1) if first else None,
+        'time_to_page_loaded_ms': round((timings['served'] - launched) * 1e3, 1),
+        'import_total_ms': round(sum(self_us for _, self_us, _, _ in modules) / 1e3, 1),
+        'requests': [{**request, 'ms': round(request['ms'], 1)} for request in timings['requests']],
+        'packages_ms': {name: round(us / 1e3, 1) for name, us in packages.most_common()},
+        'modules': [
+            {'module': name, 'self_ms': round(self_us / 1e3, 2), 'cumulative_ms': round(cumulative_us / 1e3, 2)}
+            for name, self_us, cumulative_us, _ in sorted(modules, key=lambda m: -m[1])
+        ],
+    }
+
+
+def print_report(result, top):
+    print('Phases:')
+    for name, ms in result['phases_ms'].items():
+        print(f'  {name:<28} {ms:>9.1f} ms')
+    print(f"  {'first response':<28} {result['time_to_first_response_ms']:>9.1f} ms after launch")
+    print(f"  {'page loaded':<28} {result['time_to_page_loaded_ms']:>9.1f} ms after launch")
+    print(f"\nFirst page load of {result['meta']['path']}:")
+    for request in result['requests']:
+        print(f"  {request['label']:<44} {request['status']:>4} {request['ms']:>9.1f} ms")
+    print(f"\nImports: {result['import_total_ms']:.1f} ms in total; top packages:")
+    for name, ms in list(result['packages_ms'].items())[:top]:
+        print(f'  {name:<44} {ms:>9.1f} ms')
+    print('Top modules (own import time):')
+    for module in result['modules'][:top]:
+        print(f"  {module['module']:<44} {module['self_ms']:>9.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--path', default='/', help='page to load first (default %(default)s)')
+    parser.add_argument('--top', type=int, default=15, help='packages and modules to list (default 15)')
+    parser.add_argument('--output', help='also write the full report as JSON')
+    args = parser.parse_args(argv)
+
+    result = profile(args.path)
+    print_report(result, args.top)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f'Wrote {args.output}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import os
+from pathlib import Path
+
+# Repository root (the folder that holds `data/` and `src/`)
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Location of the source dataset, overridable through the environment so the
+# app can be launched from any working directory
+DATA_PATH = Path(os.environ.get('DASHBOARD_DATA_PATH', BASE_DIR / 'data' / 'master.csv'))
+
+# Directory for the memory-mapped columnar snapshot built from DATA_PATH
+SNAPSHOT_DIR = Path(os.environ.get('DASHBOARD_SNAPSHOT_DIR', BASE_DIR / 'data' / '.snapshot'))
+
+# Rows read at a time when building the snapshot and the cube from it; peak
+# memory of a load grows with this, not with the size of the file
+CHUNK_ROWS = int(os.environ.get('DASHBOARD_CHUNK_ROWS', 1_000_000))
+
+# Server-side store for filtered selections: entries kept in each worker's
+# memory, and an optional directory shared by all workers on the box, with
+# the number of entries it keeps
+RESULT_CACHE_SIZE = int(os.environ.get('DASHBOARD_RESULT_CACHE_SIZE', 256))
+RESULT_CACHE_DIR = os.environ.get('DASHBOARD_RESULT_CACHE_DIR') or None
+RESULT_CACHE_DIR_SIZE = int(os.environ.get('DASHBOARD_RESULT_CACHE_DIR_SIZE', 1024))
+
+# Memoized callback results, per callback and worker; a TTL of 0 keeps
+# entries until they are evicted or the dataset changes
+CALLBACK_CACHE_SIZE = int(os.environ.get('DASHBOARD_CALLBACK_CACHE_SIZE', 512))
+CALLBACK_CACHE_TTL = float(os.environ.get('DASHBOARD_CALLBACK_CACHE_TTL', 0))
+
+# Run every page callback in the browser from a static bundle of the
+# pre-aggregated data exported into `assets/bundle/` (see core.clientside)
+CLIENTSIDE = os.environ.get('DASHBOARD_CLIENTSIDE', '0') == '1'
+
+# Drawing budget of the "All countries" chart (see core.overview): past
+# this many series they are packed into one WebGL trace per colour, past
+# this many points they are shown as percentile bands
+OVERVIEW_MAX_TRACES = int(os.environ.get('DASHBOARD_OVERVIEW_MAX_TRACES', 200))
+OVERVIEW_MAX_POINTS = int(os.environ.get('DASHBOARD_OVERVIEW_MAX_POINTS', 50000))
+
+# Compress responses (gzip, or brotli when the `brotli` package is
+# installed) for clients that accept it (see core.transport)
+COMPRESSION = os.environ.get('DASHBOARD_COMPRESSION', '1') == '1'
+
+# Callback requests slower than this many milliseconds are logged with their
+# inputs (see core.metrics); 0 turns the log off
+SLOW_CALLBACK_MS = float(os.environ.get('DASHBOARD_SLOW_CALLBACK_MS', 0))
+
+# Seconds between checks of DATA_PATH for a refreshed file, which is then
+# loaded without a restart (see core.dataset); 0 turns the watcher off
+RELOAD_INTERVAL = float(os.environ.get('DASHBOARD_RELOAD_INTERVAL', 30))
+
+# Shared secret for the endpoints that change the data, `POST /reload-data`
+# and `POST /ingest`; both are disabled when unset
+RELOAD_TOKEN = os.environ.get('DASHBOARD_RELOAD_TOKEN') or None
@@ -0,0 +1 @@
+# Lets the tests import `config` and `core` from this folder, as the app does
@@ -0,0 +1,111 @@
+"""Small thread-safe caches shared by the server-side stores.
+
+`LRUCache` is a bounded mapping with an optional time-to-live and hit, miss
+and eviction counters. `memoize` wraps page callbacks with one: results are
+keyed on the normalized callback inputs and the dataset version, and are
+stored already converted to plain JSON-ready data, so a hit skips both the
+computation and Plotly's figure validation. Every cache registers itself by
+name so `stats()` can report on all of them.
+"""
+import functools
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from plotly.io.json import to_json_plotly
+
+import config
+from core import dataset
+
+_MISSING = object()
+
+registry = {}
+
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entry."""
+
+    def __init__(self, maxsize=128, ttl=None, name=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        if name is not None:
+            registry[name] = self
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and self.ttl and entry[0] < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                entry = _MISSING
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+
+def stats():
+    return {name: cache.stats() for name, cache in registry.items()}
+
+
+def memoize(maxsize=None, ttl=None):
+    """Cache a callback's JSON-ready result per dataset version and inputs."""
+    def decorator(func):
+        cache = LRUCache(maxsize or config.CALLBACK_CACHE_SIZE, ttl or config.CALLBACK_CACHE_TTL,
+                         name=f'{func.__module__}.{func.__name__}')
+        seen_version = [None]
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            version = dataset.version()
+            if version != seen_version[0]:
+                # A new dataset makes every cached result stale
+                cache.clear()
+                seen_version[0] = version
+            key = json.dumps(args, sort_keys=True, default=str)
+            result = cache.get(key, _MISSING)
+            if result is _MISSING:
+                result = json.loads(to_json_plotly(func(*args)))
+                cache.set(key, result)
+            return result
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
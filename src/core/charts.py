@@ -0,0 +1,356 @@
+"""Static chart layouts and per-selection traces for the page graphs.
+
+Every results graph is split in two. The layout (axes, legend, title, paper
+colour and Plotly template) does not depend on the selection, so it is built
+once per process and shipped with the page layout. The traces are built
+straight from the cube roll-ups as plain dicts, matching what Plotly Express
+would produce without paying for its figure construction (or its import). Callbacks then
+send them with `patch_traces`, a partial property update that leaves the
+layout already in the browser untouched.
+"""
+import functools
+import json
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+from dash import Patch
+
+# Plotly Express takes its colour sequence from the default template
+COLORS = list(pio.templates[pio.templates.default].layout.colorway)
+PAPER_COLOR = '#f9f9f9'
+
+AGE_ORDER = ['5-14 years', '15-24 years', '25-34 years', '35-54 years', '55-74 years', '75+ years']
+
+
+def _layout(**layout):
+    # Start from the defaults Plotly Express adds to every figure
+    fig = go.Figure(layout=dict(legend=dict(tracegroupgap=0), margin=dict(t=60)))
+    fig.update_layout(**layout)
+    return json.loads(fig.to_json())['layout']
+
+
+def _title(text):
+    return {
+        'text': text,
+        'x': 0.5,
+        'y': 0.92,
+        'xanchor': 'center',
+        'yanchor': 'top'
+    }
+
+
+def _bottom_legend():
+    return dict(
+        title="",
+        orientation="h",      # set the orientation to 'h'orizontal
+        x=0.5,
+        y=-0.4,
+        xanchor="center",
+        yanchor="bottom"
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def line_chart(title, yaxis_title):
+    return _layout(
+        xaxis=dict(
+            anchor='y',
+            domain=[0.0, 1.0],
+            title='Year',
+            # dtick=5,              # set the interval between x-axis labels
+            tickangle=-60         # set the angle to x-axis labels
+        ),
+        yaxis=dict(anchor='x', domain=[0.0, 1.0], title=yaxis_title),
+        legend=_bottom_legend(),
+        title=_title(title),
+        paper_bgcolor=PAPER_COLOR
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def polar_chart():
+    return _layout(
+        polar=dict(
+            domain=dict(x=[0.0, 1.0], y=[0.0, 1.0]),
+            angularaxis=dict(direction='clockwise', rotation=90)
+        ),
+        legend_title='country',
+        paper_bgcolor=PAPER_COLOR
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def box_chart(title, xaxis_title, yaxis_title):
+    return _layout(
+        xaxis=dict(anchor='y', domain=[0.0, 1.0], title=xaxis_title),
+        yaxis=dict(anchor='x', domain=[0.0, 1.0], title=yaxis_title),
+        boxmode='group',
+        legend=_bottom_legend(),
+        title=_title(title),
+        paper_bgcolor=PAPER_COLOR
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def bar_chart(xaxis_title, yaxis_title):
+    return _layout(
+        xaxis=dict(anchor='y', domain=[0.0, 1.0], title=xaxis_title),
+        yaxis=dict(anchor='x', domain=[0.0, 1.0], title=yaxis_title),
+        legend_title='country',
+        barmode='group'
+    )
+
+
+def _groups(frame, color):
+    # Plotly Express assigns colours in order of first appearance
+    for i, (name, group) in enumerate(frame.groupby(color, sort=False)):
+        yield name, group, COLORS[i % len(COLORS)]
+
+
+def line_traces(frame, x, y, color):
+    return [
+        {
+            'type': 'scatter',
+            'mode': 'lines',
+            'name': name,
+            'legendgroup': name,
+            'showlegend': True,
+            'line': {'color': line_color, 'dash': 'solid'},
+            'marker': {'symbol': 'circle'},
+            'orientation': 'v',
+            'x': group[x].tolist(),
+            'y': group[y].tolist(),
+            'xaxis': 'x',
+            'yaxis': 'y',
+            'hovertemplate': f'{color}={name}<br>{x}=%{{x}}<br>{y}=%{{y}}<extra></extra>',
+        }
+        for name, group, line_color in _groups(frame, color)
+    ]
+
+
+def gl_line_traces(names, x, values, y, color='country', legend=20):
+    """One WebGL line per row of `values`; NaNs are left out, like missing rows.
+
+    Only the first `legend` lines get a legend entry.
+    """
+    traces = []
+    for i, (name, row) in enumerate(zip(names, values)):
+        has_data = ~np.isnan(row)
+        traces.append({
+            'type': 'scattergl',
+            'mode': 'lines',
+            'name': name,
+            'legendgroup': name,
+            'showlegend': len(names) <= legend,
+            'line': {'color': COLORS[i % len(COLORS)], 'dash': 'solid'},
+            'x': x[has_data].tolist(),
+            'y': row[has_data].tolist(),
+            'hovertemplate': f'{color}={name}<br>year=%{{x}}<br>{y}=%{{y}}<extra></extra>',
+        })
+    return traces
+
+
+def packed_line_traces(names, x, values, y, color='country'):
+    """Every line of `values` in one WebGL trace per colour, split by gaps."""
+    traces = []
+    for i, line_color in enumerate(COLORS[:len(names)]):
+        rows = values[i::len(COLORS)]
+        # A NaN column after every line breaks it from the next one (NaN is
+        # written as null, a gap)
+        padded = np.hstack([rows, np.full((len(rows), 1), np.nan)])
+        xs = np.tile(np.append(x.astype(float), np.nan), len(rows))
+        keep = ~np.isnan(padded)
+        keep[:, -1] = True
+        keep = keep.ravel()
+        traces.append({
+            'type': 'scattergl',
+            'mode': 'lines',
+            'name': '',
+            'showlegend': False,
+            'line': {'color': line_color, 'width': 1},
+            'x': xs[keep].tolist(),
+            'y': padded.ravel()[keep].tolist(),
+            'text': np.repeat(names[i::len(COLORS)], keep.reshape(len(rows), -1).sum(axis=1)).tolist(),
+            'hovertemplate': f'{color}=%{{text}}<br>year=%{{x}}<br>{y}=%{{y}}<extra></extra>',
+        })
+    return traces
+
+
+def band_traces(x, percentiles, y, color=COLORS[0]):
+    """Percentile bands across the lines, `{q: values}`, with the median on top."""
+    traces = []
+    bands = sorted((q, 100 - q) for q in percentiles if q < 50)
+    for opacity, (low, high) in zip((0.15, 0.25, 0.35), bands):
+        name = 'min-max' if (low, high) == (0, 100) else f'p{low}-p{high}'
+        for q, fill in ((low, 'none'), (high, 'tonexty')):
+            traces.append({
+                'type': 'scattergl',
+                'mode': 'lines',
+                'name': name,
+                'legendgroup': name,
+                'showlegend': fill != 'none',
+                'line': {'color': color, 'width': 0},
+                'fill': fill,
+                'fillcolor': _rgba(color, opacity),
+                'x': x.tolist(),
+                'y': percentiles[q].tolist(),
+                'hovertemplate': f'p{q}<br>year=%{{x}}<br>{y}=%{{y}}<extra></extra>',
+            })
+    traces.append({
+        'type': 'scattergl',
+        'mode': 'lines',
+        'name': 'median',
+        'legendgroup': 'median',
+        'showlegend': True,
+        'line': {'color': color, 'width': 2},
+        'x': x.tolist(),
+        'y': percentiles[50].tolist(),
+        'hovertemplate': f'median<br>year=%{{x}}<br>{y}=%{{y}}<extra></extra>',
+    })
+    return traces
+
+
+def _rgba(hex_color, opacity):
+    red, green, blue = (int(hex_color[i:i + 2], 16) for i in (1, 3, 5))
+    return f'rgba({red},{green},{blue},{opacity})'
+
+
+def polar_traces(frame, r, theta, color):
+    traces = []
+    for name, group, line_color in _groups(frame, color):
+        # Close each line by repeating its first point
+        rs, thetas = group[r].tolist(), group[theta].tolist()
+        traces.append({
+            'type': 'scatterpolar',
+            'mode': 'lines',
+            'name': name,
+            'legendgroup': name,
+            'showlegend': True,
+            'line': {'color': line_color, 'dash': 'solid'},
+            'marker': {'symbol': 'circle'},
+            'r': rs + rs[:1],
+            'theta': thetas + thetas[:1],
+            'subplot': 'polar',
+            'hovertemplate': f'{color}={name}<br>{r}=%{{r}}<br>{theta}=%{{theta}}<extra></extra>',
+        })
+    return traces
+
+
+def box_traces(frame, x, y):
+    return [{
+        'type': 'box',
+        'name': '',
+        'legendgroup': '',
+        'showlegend': False,
+        'alignmentgroup': 'True',
+        'offsetgroup': '',
+        'notched': False,
+        'marker': {'color': COLORS[0]},
+        'orientation': 'v',
+        'x': frame[x].tolist(),
+        'y': frame[y].tolist(),
+        'x0': ' ',
+        'y0': ' ',
+        'xaxis': 'x',
+        'yaxis': 'y',
+        'hovertemplate': f'{x}=%{{x}}<br>{y}=%{{y}}<extra></extra>',
+    }]
+
+
+def bar_traces(frame, x, y, color):
+    return [
+        {
+            'type': 'bar',
+            'name': name,
+            'legendgroup': name,
+            'showlegend': True,
+            'alignmentgroup': 'True',
+            'offsetgroup': name,
+            'marker': {'color': bar_color, 'pattern': {'shape': ''}},
+            'orientation': 'h',
+            'textposition': 'auto',
+            'x': group[x].tolist(),
+            'y': group[y].tolist(),
+            'xaxis': 'x',
+            'yaxis': 'y',
+            'hovertemplate': f'{color}={name}<br>{x}=%{{x}}<br>{y}=%{{y}}<extra></extra>',
+        }
+        for name, group, bar_color in _groups(frame, color)
+    ]
+
+
+@functools.lru_cache(maxsize=None)
+def pie_chart():
+    return _layout(
+        # adjust margin to move the chart position
+        margin=dict(l=20, r=0, t=30, b=0),
+        legend=dict(
+            orientation='h'                 # horizontal orientation,
+        ),
+        paper_bgcolor=PAPER_COLOR
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def empty_chart():
+    return _layout()
+
+
+def age_pie(chart_data, country):
+    """Pie of one country's suicide rate per age group."""
+    if chart_data.empty:
+        return figure(empty_chart(), [{
+            'type': 'pie',
+            'domain': {'x': [0.0, 1.0], 'y': [0.0, 1.0]},
+            'name': '',
+            'legendgroup': '',
+            'showlegend': False,
+            'values': [1],
+            'hovertemplate': 'value=%{value}<extra></extra>',
+        }])
+
+    # add ordered categories to age column
+    chart_data = chart_data.assign(age=pd.Categorical(
+        chart_data['age'], categories=AGE_ORDER, ordered=True))
+    chart_data = chart_data.sort_values(
+        'age')  # sort by age column
+    return figure({**pie_chart(), 'title': {'text': country}}, [{
+        'type': 'pie',
+        'domain': {'x': [0.0, 1.0], 'y': [0.0, 1.0]},
+        'name': '',
+        'legendgroup': '',
+        'showlegend': True,
+        'labels': chart_data['age'].tolist(),
+        'values': chart_data['suicides_100k_pop'].tolist(),
+        'sort': False,
+        'textposition': 'inside',   # set text position to inside of the slices
+        'hovertemplate': 'Age Group=%{label}<br>Suicides per 100K Population=%{value}<extra></extra>',
+    }])
+
+
+def world_treemap(frame):
+    """Treemap of suicides per country and age group over the whole dataset."""
+    # Only needed once per dataset version, so Plotly Express is not
+    # imported until then
+    import plotly.express as px
+
+    fig = px.treemap(frame[['country', 'age', 'suicides_no']], path=['country', 'age'], values='suicides_no')
+
+    fig.update_layout(
+        title=_title('Distribution of suicides across age groups over the world'),
+        paper_bgcolor=PAPER_COLOR
+    )
+    return fig
+
+
+def figure(layout, traces=()):
+    return {'data': list(traces), 'layout': layout}
+
+
+def patch_traces(traces):
+    """Partial update that swaps a graph's traces and keeps its layout."""
+    patched = Patch()
+    patched['data'] = traces
+    return patched
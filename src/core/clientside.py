@@ -0,0 +1,146 @@
+"""Optional browser-only mode of the dashboard.
+
+With `DASHBOARD_CLIENTSIDE=1` the app exports the pre-aggregated cube to a
+static JSON bundle in `assets/bundle/`, and every page callback is registered
+as a clientside function of `assets/clientside.js` instead of a Flask
+endpoint. The browser fetches the bundle once, then resolves the selection,
+computes the metrics and builds the chart traces itself. The server only
+hands out the page layouts and static files, so slider latency no longer
+depends on server load and the pages can sit behind a CDN.
+
+The bundle lists the non-empty cells of `core.cube.Cube`, sorted by
+(country, year, sex, age, generation), as one array per dimension code and
+per measure. `offsets[i]:offsets[i + 1]` are the cells of the i-th country,
+so the browser slices a selection the way `core.index` does. Figures that do
+not depend on the selection (the world treemap, the pie skeletons) are
+rendered here once and shipped as they are.
+
+Usage (export without starting the app):
+
+    python -m core.clientside
+"""
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import dash
+import numpy as np
+from dash import ClientsideFunction
+
+import config
+from core import charts, dataset
+from core.cube import DIMENSIONS, MEASURES
+
+BUNDLE_PATH = Path(__file__).resolve().parent.parent / 'assets' / 'bundle' / 'data.json'
+FORMAT_VERSION = 1
+NAMESPACE = 'bundle'
+
+
+def _flatten(args):
+    for arg in args:
+        if isinstance(arg, (list, tuple)):
+            yield from _flatten(arg)
+        else:
+            yield arg
+
+
+def callback(function_name, output, *args, state=()):
+    """`dash.callback`, or `function_name` of assets/clientside.js in clientside mode.
+
+    `state` lists extra `State`s only the clientside function reads.
+    """
+    def decorator(func):
+        if config.CLIENTSIDE:
+            # Clientside functions take grouped inputs as one flat argument list
+            dash.clientside_callback(
+                ClientsideFunction(NAMESPACE, function_name), output, list(_flatten(args)) + list(state))
+            return func
+        return dash.callback(output, *args)(func)
+    return decorator
+
+
+def _compact(values):
+    # Whole-number sums are written without the trailing '.0'
+    if values.dtype.kind == 'f' and np.array_equal(values, np.round(values)):
+        values = values.astype(np.int64)
+    return values.tolist()
+
+
+def _figure(fig):
+    return json.loads(fig.to_json())
+
+
+def build():
+    data = dataset.current()
+    cube = data.cube
+    cells = np.nonzero(cube.rows)
+    codes = dict(zip(DIMENSIONS, cells), generation=cube.generation[cells])
+
+    n_countries = len(cube.labels['country'])
+    offsets = np.searchsorted(codes['country'], np.arange(n_countries + 1))
+
+    # Years with a non-zero suicide rate, for the "last year with data" clamp
+    # of `core.selection.resolve`
+    rates = cube.sums['suicides_100k_pop'].sum(axis=(2, 3))
+    data_years = [(np.flatnonzero(rates[i]) + cube.first_year).tolist() for i in range(n_countries)]
+
+    # The browser fills in the pie's labels, values and title
+    by_age = cube.view().frame('country', 'age')
+    pie, empty = charts.age_pie(by_age.head(1), 'country'), charts.age_pie(by_age.head(0), 'country')
+
+    return {
+        'format': FORMAT_VERSION,
+        'version': data.version,
+        'first_year': cube.first_year,
+        'labels': {dim: cube.labels[dim].tolist() for dim in DIMENSIONS if dim != 'year'},
+        'offsets': offsets.tolist(),
+        'cells': {
+            **{dim: codes[dim].tolist() for dim in DIMENSIONS if dim != 'country'},
+            'rows': cube.rows[cells].tolist(),
+            **{measure: _compact(cube.sums[measure][cells]) for measure in MEASURES},
+        },
+        'data_years': data_years,
+        'colors': charts.COLORS,
+        'figures': {
+            'world': _figure(charts.world_treemap(by_age)),
+            'pie': pie,
+            'pie_empty': empty,
+        },
+    }
+
+
+def read_version(path=BUNDLE_PATH):
+    try:
+        with open(path) as f:
+            bundle = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if bundle.get('format') != FORMAT_VERSION:
+        return None
+    return bundle.get('version')
+
+
+def export(path=BUNDLE_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Browsers only ever fetch a complete file: write aside, then rename
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(build(), f, separators=(',', ':'))
+    # mkstemp creates private files; the bundle is public
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+    return path
+
+
+def ensure(path=BUNDLE_PATH):
+    """Export the bundle unless it already matches the loaded dataset."""
+    if read_version(path) != dataset.version():
+        export(path)
+    return path
+
+
+if __name__ == '__main__':
+    path = export()
+    print(f'Wrote {path.stat().st_size} bytes to {path}')
@@ -0,0 +1,241 @@
+"""Dense pre-aggregated cube of the dataset.
+
+Built once at load: every measure is summed into a NumPy array indexed by
+encoded (country, year, sex, age), next to a count of the source rows that
+fell into each cell. All the rows of a cell belong to one generation, so
+generation is stored as one code per cell rather than as a fifth axis that
+would be mostly zeros; a roll-up by generation spreads the cells over it. A
+page selection becomes a `CubeView`, a slice of the cube with the
+out-of-range years zeroed. Its roll-ups are sums over a few thousand cells,
+not pandas groupbys over raw rows.
+
+The rows are read `config.CHUNK_ROWS` at a time, so building the cube from
+the memory-mapped snapshot needs the cube plus one chunk of memory, whatever
+the number of rows.
+
+`CubeView.frame(*keys)` returns the same table as
+`df.groupby(list(keys)).sum().reset_index()` on the selected rows would. The
+page code that shapes that table into figures stays unchanged.
+"""
+import numpy as np
+import pandas as pd
+
+import config
+
+DIMENSIONS = ('country', 'year', 'sex', 'age', 'generation')
+MEASURES = ('suicides_no', 'population', 'suicides_100k_pop', 'gdp_per_capita ($)')
+# Axes of the stored arrays; `generation` is the code array `Cube.generation`
+AXES = DIMENSIONS[:4]
+
+
+class Cube:
+    def __init__(self, df):
+        self.labels, ranks = {}, {}
+        for dim in DIMENSIONS:
+            if dim == 'year':
+                years = df['year'].to_numpy()
+                self.first_year = int(years.min())
+                self.labels['year'] = np.arange(self.first_year, int(years.max()) + 1)
+            else:
+                # Labels appended to the snapshot get the next codes, out of
+                # label order (see `core.snapshot.append`); the cube keeps
+                # them sorted whatever the order of the codes. Missing values
+                # (code -1) stay -1
+                categories = np.asarray(df[dim].cat.categories, dtype=object)
+                order = np.argsort(categories, kind='stable')
+                self.labels[dim] = categories[order]
+                ranks[dim] = np.append(np.argsort(order), -1)
+        self._allocate()
+        for start in range(0, len(df), config.CHUNK_ROWS):
+            part = df.iloc[start:start + config.CHUNK_ROWS]
+            codes = [part['year'].to_numpy() - self.first_year if dim == 'year'
+                     else ranks[dim][part[dim].cat.codes.to_numpy()]
+                     for dim in DIMENSIONS]
+            self._add_rows(codes, part)
+        self.sums['population'] = self.sums['population'].round().astype(np.int64)
+
+    def _allocate(self, population=float):
+        self.shape = tuple(len(self.labels[dim]) for dim in DIMENSIONS)
+        self._country_codes = {c: i for i, c in enumerate(self.labels['country'])}
+        self._sex_codes = {s: i for i, s in enumerate(self.labels['sex'])}
+        shape = self.shape[:len(AXES)]
+        self.rows = np.zeros(shape, dtype=np.int64)
+        self.generation = np.full(shape, -1, dtype=np.int8 if self.shape[-1] < 127 else np.int32)
+        self.sums = {measure: np.zeros(shape, dtype=population if measure == 'population' else float)
+                     for measure in MEASURES}
+
+    def _add_rows(self, codes, part):
+        if not len(part):
+            return
+        cells = np.ravel_multi_index(codes[:len(AXES)], self.rows.shape)
+        generation = self.generation.reshape(-1)
+        clash = (generation[cells] >= 0) & (generation[cells] != codes[-1])
+        generation[cells] = codes[-1]
+        # Two rows of this chunk in one cell with different generations
+        clash |= generation[cells] != codes[-1]
+        if clash.any():
+            raise ValueError(f'{int(clash.sum())} rows disagree on the generation of their (country, year, sex, age)')
+
+        # Rows come sorted by (country, year, sex), so a chunk covers a narrow
+        # band of cells: count into that band only
+        low, high = int(cells.min()), int(cells.max()) + 1
+        cells = cells - low
+        self.rows.reshape(-1)[low:high] += np.bincount(cells, minlength=high - low)
+        for measure, sums in self.sums.items():
+            # Missing values count as zero, as they do in `Series.sum()`
+            values = np.nan_to_num(part[measure].to_numpy(dtype=float))
+            totals = np.bincount(cells, weights=values, minlength=high - low)
+            if sums.dtype.kind == 'i':
+                totals = totals.round().astype(sums.dtype)
+            sums.reshape(-1)[low:high] += totals
+
+    def add(self, df):
+        """A cube that also counts the rows of `df`.
+
+        The existing cells are copied into the (possibly larger) new shape
+        and only the cells of the new rows are summed, so `df` must only hold
+        (country, year) pairs this cube has no rows for; adding them to a
+        copy gives the same cube as building from all the rows.
+        """
+        cube = Cube.__new__(Cube)
+        cube.labels, positions = {}, []
+        for dim in DIMENSIONS:
+            old = self.labels[dim]
+            if dim == 'year':
+                years = df['year'].to_numpy()
+                cube.first_year = min(self.first_year, int(years.min(initial=self.first_year)))
+                cube.labels['year'] = np.arange(cube.first_year, max(int(old[-1]), int(years.max(initial=old[-1]))) + 1)
+                positions.append(old - cube.first_year)
+            else:
+                cube.labels[dim] = np.asarray(sorted(set(old) | set(df[dim].astype(str))), dtype=object)
+                positions.append(np.searchsorted(cube.labels[dim], old))
+        cube._allocate(population=np.int64)
+
+        old_cells = _cells(positions[:len(AXES)])
+        cube.rows[old_cells] = self.rows
+        if _cells(positions[-1:]) == (slice(0, len(positions[-1])),):
+            cube.generation[old_cells] = self.generation
+        else:
+            cube.generation[old_cells] = np.where(self.generation >= 0, positions[-1][self.generation], -1)
+        for measure, sums in self.sums.items():
+            cube.sums[measure][old_cells] = sums
+        codes = [df['year'].to_numpy() - cube.first_year if dim == 'year'
+                 else np.searchsorted(cube.labels[dim], df[dim].astype(str).to_numpy())
+                 for dim in DIMENSIONS]
+        cube._add_rows(codes, df)
+        return cube
+
+    def country_years(self, measure, sex='both'):
+        """`measure` summed per (country, year), and the count of rows behind each sum.
+
+        Every country at once, straight from the cells: no `CubeView` copy
+        of the selected cells is made.
+        """
+        if sex == 'both':
+            return self.sums[measure].sum(axis=(2, 3)), self.rows.sum(axis=(2, 3))
+        code = self._sex_codes.get(sex)
+        if code is None:
+            shape = self.rows.shape[:2]
+            return np.zeros(shape), np.zeros(shape, dtype=np.int64)
+        return self.sums[measure][:, :, code].sum(axis=-1), self.rows[:, :, code].sum(axis=-1)
+
+    def view(self, spans=None, sex='both'):
+        """Slice of the cube for `[(country, (first_year, last_year)), ...]`.
+
+        Defaults to every country over every year.
+        """
+        if spans is None:
+            years = (int(self.labels['year'][0]), int(self.labels['year'][-1]))
+            spans = [(country, years) for country in self.labels['country']]
+        return CubeView(self, spans, sex)
+
+
+def _cells(positions):
+    # Where the cells of the old labels go: a slice for each axis whose old
+    # labels stay together, so the copy is a block copy rather than a gather
+    index = tuple(slice(p[0], p[0] + len(p)) if len(p) and p[-1] - p[0] == len(p) - 1 else p for p in positions)
+    if sum(not isinstance(p, slice) for p in index) > 1:
+        return np.ix_(*positions)
+    return index
+
+
+class CubeView:
+    def __init__(self, cube, spans, sex):
+        # A country picked twice is counted once
+        unique = {}
+        for country, years in spans:
+            unique.setdefault(country, years)
+        spans = list(unique.items())
+        self.countries = [country for country, _ in spans]
+        self.spans = spans
+        self.sex = sex
+        self.labels = dict(cube.labels, country=np.asarray(self.countries, dtype=object))
+
+        n_years = cube.shape[1]
+        mask = np.zeros((len(spans), n_years), dtype=bool)
+        codes = []
+        for i, (country, (first, last)) in enumerate(spans):
+            code = cube._country_codes.get(country)
+            codes.append(0 if code is None else code)
+            if code is not None:
+                mask[i, max(first - cube.first_year, 0):max(last - cube.first_year + 1, 0)] = True
+        sexes = slice(None)
+        if sex != 'both':
+            code = cube._sex_codes.get(sex)
+            sexes = [0 if code is None else code]
+            if code is None:
+                mask[:] = False
+        mask = mask[:, :, None, None]
+
+        self.rows = cube.rows[codes][:, :, sexes] * mask
+        self.sums = {measure: values[codes][:, :, sexes] * mask for measure, values in cube.sums.items()}
+        self.generation = cube.generation[codes][:, :, sexes]
+
+    def rollup(self, measure, *keys):
+        """Array of `measure` summed over every dimension not in `keys`."""
+        values = self.rows if measure == 'rows' else self.sums[measure]
+        if 'generation' in keys:
+            # Spread every cell over the generation axis: all of it lands in
+            # the slot of its generation
+            values = values[..., None] * (self.generation[..., None] == np.arange(self.labels['generation'].size))
+        axes = tuple(i for i, dim in enumerate(DIMENSIONS[:values.ndim]) if dim not in keys)
+        return values.sum(axis=axes)
+
+    def rate(self, *keys):
+        """Suicides per 100k population, weighted by population."""
+        population = self.rollup('population', *keys)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.rollup('suicides_no', *keys) / population * 1e5
+
+    def frame(self, *keys):
+        """Equivalent of `groupby(list(keys)).sum().reset_index()` on the rows.
+
+        Only combinations backed by at least one row are listed, plus the
+        zero placeholder row the selection adds for a country without data,
+        and a `rows` column counts the source rows behind each line.
+        """
+        dims = [dim for dim in DIMENSIONS if dim in keys]
+        rows = self.rollup('rows', *keys)
+        observed = np.nonzero(rows)
+        data = {dim: self.labels[dim][position] for dim, position in zip(dims, observed)}
+        for measure in MEASURES:
+            data[measure] = self.rollup(measure, *keys)[observed]
+        data['rows'] = rows[observed]
+        frame = pd.DataFrame(data, columns=dims + list(MEASURES) + ['rows'])
+
+        if set(keys) <= {'country', 'year'}:
+            empty = self.rollup('rows', 'country') == 0
+            placeholders = pd.DataFrame({
+                'country': [country for country, is_empty in zip(self.countries, empty) if is_empty],
+                'year': [first for (_, (first, _)), is_empty in zip(self.spans, empty) if is_empty],
+            })
+            if len(placeholders):
+                placeholders = placeholders[dims].assign(**{measure: 0 for measure in MEASURES}, rows=0)
+                frame = pd.concat([frame, placeholders], ignore_index=True)
+
+        frame = frame.astype({'population': np.int64, 'rows': np.int64})
+        return frame.sort_values(list(keys)).reset_index(drop=True)[list(keys) + list(MEASURES) + ['rows']]
+
+    def series(self, measure, key):
+        """Equivalent of `groupby(key)[measure].sum()` on the rows."""
+        return self.frame(key).set_index(key)[measure]
@@ -0,0 +1,213 @@
+"""Load-once access to the suicide-rates dataset.
+
+Every page imports the frame from here instead of parsing the CSV itself, so a
+worker process holds exactly one copy of the data. The frame is memory-mapped
+from the columnar snapshot in `core.snapshot` (rebuilt when the CSV changes),
+so its arrays are read-only and shared between processes. Callers get a
+shallow view, or the `core.index.SelectionIndex` and `core.cube.Cube` built
+over it.
+
+A refreshed CSV is picked up without a restart. `reload()` builds the new
+frame, index and cube off to the side while requests keep reading the old
+ones, then swaps all of them in with a single assignment. A reader that takes
+`current()` once and reads everything from it never mixes two versions;
+separate `get_index()` and `get_cube()` calls may straddle a swap. The new
+`version()` token invalidates every cache keyed on it, and `on_reload`
+listeners regenerate whatever else derives from the data. `watch()` runs a
+reload whenever the file changes. `apply()` swaps in data derived from the
+current version instead, which is how `core.ingest` adds rows without a
+reload.
+"""
+import collections
+import functools
+import logging
+import os
+import threading
+import time
+
+import config
+from core import snapshot
+from core.cube import Cube
+from core.index import SelectionIndex
+
+logger = logging.getLogger(__name__)
+
+# Everything derived from one version of the source, swapped as a unit
+Data = collections.namedtuple('Data', 'df index cube version source_stat')
+
+_lock = threading.Lock()
+_reload_lock = threading.Lock()
+_current = None
+_listeners = []
+_watcher_pid = None
+
+
+def load(path=None, snapshot_dir=None):
+    """Return `(df, version)`, where version is the source CSV's hash."""
+    path = path or config.DATA_PATH
+    snapshot_dir = snapshot_dir or config.SNAPSHOT_DIR
+    try:
+        manifest = snapshot.ensure(path, snapshot_dir)
+    except OSError:
+        # A read-only deployment can still serve straight from the CSV
+        logger.warning('Could not write snapshot to %s, parsing %s instead', snapshot_dir, path, exc_info=True)
+        return snapshot.prepare(snapshot.read_source(path)), snapshot.file_hash(path)
+    return snapshot.load(manifest, snapshot_dir), manifest['source_hash']
+
+
+def _source_stat():
+    try:
+        stat = os.stat(config.DATA_PATH)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _build():
+    # Taken first, so a change made while loading is seen by the watcher
+    source_stat = _source_stat()
+    df, version = load()
+    return _derive(df, version, source_stat)
+
+
+def _derive(df, version, source_stat):
+    return Data(df, SelectionIndex(df), Cube(df), version, source_stat)
+
+
+def _ensure_loaded():
+    global _current
+    if _current is None:
+        with _lock:
+            if _current is None:
+                _current = _build()
+    return _current
+
+
+def current():
+    """The loaded `Data`: frame, index, cube and version token of one version."""
+    return _ensure_loaded()
+
+
+def get_df():
+    # A shallow copy lets callers add or drop columns without touching the
+    # shared frame; the values themselves stay shared and read-only
+    return _ensure_loaded().df.copy(deep=False)
+
+
+def get_index():
+    return _ensure_loaded().index
+
+
+def get_cube():
+    return _ensure_loaded().cube
+
+
+def version():
+    """Identifier of the loaded data, for keying derived caches."""
+    return _ensure_loaded().version
+
+
+def country_options():
+    """Options of the pages' country dropdowns, built once per version."""
+    return _country_options(version())
+
+
+@functools.lru_cache(maxsize=1)
+def _country_options(version):
+    return [{'label': country, 'value': country} for country in sorted(get_index().countries)]
+
+
+def on_reload(listener):
+    """Call `listener()` after each reload that brought in new data."""
+    _listeners.append(listener)
+    return listener
+
+
+def reload():
+    """Load the source again and swap it in if its content changed.
+
+    Runs on the calling thread; requests are served from the previous
+    version until the swap. Returns whether the data changed.
+    """
+    global _current
+    with _reload_lock:
+        current = _ensure_loaded()
+        source_stat = _source_stat()
+        # Mapping the snapshot is cheap; the version it carries also covers
+        # rows another process appended (see `core.ingest`)
+        df, version = load()
+        if version == current.version:
+            # Touched, not changed
+            _current = current._replace(source_stat=source_stat)
+            return False
+        _current = _derive(df, version, source_stat)
+        logger.info('Loaded dataset version %s (%d rows)', _current.version, len(_current.df))
+    _notify()
+    return True
+
+
+def apply(change):
+    """Swap in `change(data)`, new `Data` derived from the loaded `data`.
+
+    Serialized with `reload()`, and listeners are called the same way.
+    Whatever `change` raises propagates and leaves the data as it was.
+    """
+    global _current
+    with _reload_lock:
+        _current = change(_ensure_loaded())
+        logger.info('Updated dataset to version %s (%d rows)', _current.version, len(_current.df))
+    _notify()
+    return _current
+
+
+def _notify():
+    for listener in list(_listeners):
+        try:
+            listener()
+        except Exception:
+            logger.exception('Dataset reload listener %r failed', listener)
+
+
+def reload_in_background():
+    """Start `reload()` on a thread unless one is already running."""
+    if _reload_lock.locked():
+        return False
+    threading.Thread(target=_reload_logged, name='dataset-reload', daemon=True).start()
+    return True
+
+
+def _reload_logged():
+    try:
+        reload()
+    except Exception:
+        logger.exception('Could not reload %s', config.DATA_PATH)
+
+
+def _watch(interval):
+    previous = None
+    while True:
+        time.sleep(interval)
+        stat = _source_stat()
+        # Only reload a file that has stopped changing, not one still being
+        # written; an atomic rename into place is picked up on the next poll
+        if stat is not None and stat == previous and stat != _ensure_loaded().source_stat:
+            _reload_logged()
+        previous = stat
+
+
+def watch(interval=None):
+    """Reload in the background whenever the source file changes.
+
+    Threads do not survive a fork, so this is meant to be called in every
+    worker, e.g. on each request: it starts one watcher per process and is
+    a no-op afterwards. An interval of 0 disables watching.
+    """
+    global _watcher_pid
+    interval = config.RELOAD_INTERVAL if interval is None else interval
+    if not interval or _watcher_pid == os.getpid():
+        return
+    with _lock:
+        if _watcher_pid == os.getpid():
+            return
+        _watcher_pid = os.getpid()
+    threading.Thread(target=_watch, args=(interval,), name='dataset-watcher', daemon=True).start()
@@ -0,0 +1,169 @@
+"""Streamed download of a page's selection as CSV or Parquet.
+
+`GET /export` takes the selection of a page (`country` once per country,
+`from`, `to`, `sex`) and a `format`, and streams the selected source rows
+with every column of the dataset. The spans are resolved by
+`core.selection.resolve`, as for `update_data_store`, so the file holds the
+rows behind the charts on screen; without any `country`, or with `clamp=0`,
+the year range is taken as it is for every country, as the "All countries"
+chart does.
+
+Nothing holds the whole export. The rows are walked `CHUNK_ROWS` at a time
+(`SelectionIndex.iter_positions`); each chunk is gathered from the
+memory-mapped frame, written as CSV lines or as one Parquet row group, and
+sent before the next one is read. The rows come from the `core.dataset.Data`
+taken when the download started, even if a reload swaps in new data
+meanwhile.
+
+Parquet needs `pyarrow` (in requirements.txt); without it only CSV is offered.
+It is imported by the first Parquet export, not when a worker starts.
+
+Each page carries download links (`links`) whose URLs a clientside callback
+(`register`, assets/export.js) keeps in step with the page's controls. The
+browser then downloads from this endpoint directly: a `dcc.Download` would
+have the callback send the whole file, base64-encoded in its JSON response.
+"""
+import importlib.util
+
+import dash
+from dash import ClientsideFunction, dcc, html
+from dash.dependencies import Input, Output, State
+
+from core import selection
+
+# Rows per CSV chunk and per Parquet row group
+CHUNK_ROWS = 65536
+SEXES = ('both', 'male', 'female')
+
+# Format: (label, MIME type)
+FORMATS = {'csv': ('CSV', 'text/csv')}
+if importlib.util.find_spec('pyarrow') is not None:  # optional: CSV only
+    FORMATS['parquet'] = ('Parquet', 'application/vnd.apache.parquet')
+
+
+class ExportError(ValueError):
+    """The export request is malformed."""
+
+
+def parse(args, data):
+    """Selection and format of the query string `args` (a `MultiDict`)."""
+    export_format = args.get('format', 'csv')
+    if export_format not in FORMATS:
+        raise ExportError(f'format must be one of {", ".join(FORMATS)}')
+    sex = args.get('sex', 'both')
+    if sex not in SEXES:
+        raise ExportError(f'sex must be one of {", ".join(SEXES)}')
+    years = data.cube.labels['year']
+    try:
+        first = int(args.get('from', years[0]))
+        last = int(args.get('to', years[-1]))
+    except ValueError:
+        raise ExportError('from and to must be years') from None
+    countries = args.getlist('country')
+    return {
+        'countries': countries,
+        'year_range': [first, last],
+        'sex': sex,
+        'clamp': bool(countries) and args.get('clamp', '1') != '0',
+    }, export_format
+
+
+def chunks(data, countries, year_range, sex, clamp=True):
+    """The selected rows of `data` as DataFrames of at most `CHUNK_ROWS` rows."""
+    index = data.index
+    if clamp:
+        spans = selection.resolve(data, countries, year_range)
+    else:
+        spans = [(country, tuple(year_range)) for country in (countries or index.countries)]
+    for positions in index.iter_positions(spans, sex, CHUNK_ROWS):
+        if len(positions):
+            yield index.df.take(positions)
+
+
+def csv_stream(frames, columns):
+    header = True
+    for frame in frames:
+        yield frame.to_csv(index=False, header=header, lineterminator='\n')
+        header = False
+    if header:
+        # No rows: still a file with the columns
+        yield columns.to_csv(index=False, lineterminator='\n')
+
+
+class _Sink:
+    """File object for `ParquetWriter` that hands out what was written so far."""
+
+    def __init__(self):
+        self.parts, self.position, self.closed = [], 0, False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def take(self):
+        data, self.parts = b''.join(self.parts), []
+        return data
+
+
+def parquet_stream(frames, columns):
+    import pyarrow
+    import pyarrow.parquet
+
+    sink, writer = _Sink(), None
+    try:
+        for frame in frames:
+            table = pyarrow.Table.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                writer = pyarrow.parquet.ParquetWriter(sink, table.schema)
+            writer.write_table(table)
+            yield sink.take()
+        if writer is None:
+            # No rows: still a file with the columns
+            table = pyarrow.Table.from_pandas(columns, preserve_index=False)
+            writer = pyarrow.parquet.ParquetWriter(sink, table.schema)
+    finally:
+        if writer is not None:
+            writer.close()
+    yield sink.take()
+
+
+def stream(data, selected, export_format):
+    """`(body chunks, MIME type, file name)` of an export of `data`."""
+    frames, columns = chunks(data, **selected), data.df.head(0)
+    body = (csv_stream if export_format == 'csv' else parquet_stream)(frames, columns)
+    first, last = selected['year_range']
+    name = f'suicide-rates-{first}-{last}-{selected["sex"]}.{export_format}'
+    return body, FORMATS[export_format][1], name
+
+
+def links(prefix, clamp=True):
+    """Download links of a page, one per format; `register` keeps them up to date."""
+    return html.Div([
+        dcc.Store(id=f'{prefix}-export', data={'formats': list(FORMATS), 'clamp': clamp}),
+        *[html.A(f'Download {label}', id=f'{prefix}-export-{export_format}', href='', download='',
+                 className='export-link')
+          for export_format, (label, _) in FORMATS.items()],
+    ], className='export-links')
+
+
+def register(prefix, countries, year_range, sex):
+    """Point the links of `links(prefix)` at the selection of the given controls."""
+    dash.clientside_callback(
+        ClientsideFunction('export', 'links'),
+        [Output(f'{prefix}-export-{export_format}', 'href') for export_format in FORMATS],
+        [Input(countries, 'value'), Input(year_range, 'value'), Input(sex, 'value')],
+        State(f'{prefix}-export', 'data'),
+    )
@@ -0,0 +1,171 @@
+"""Sorted (country, year, sex) index over the dataset.
+
+The snapshot stores rows ordered by country, then year, then sex, so every
+(country, year range) is one contiguous block of rows. A selection of any
+number of countries is two vectorized binary searches plus a gather, and only
+the selected rows are ever touched: the cost does not grow with the number of
+countries in the file.
+
+Rows appended since the snapshot was built (see `core.snapshot.append`)
+follow it as segments that are each sorted the same way, so the frame is a
+few sorted runs rather than one. Every run gets its own sort key and binary
+searches; a (country, year) lies in a single run, so a country whose years
+are spread over several runs has its rows put back in year order.
+
+It also keeps, per country and per sex, the sorted years whose summed
+`suicides_100k_pop` is non-zero, so "latest year with data" is a bisect.
+After an append (see `core.ingest`) only the appended run is keyed, and those
+years are recomputed only for the countries that got new rows; the rest is
+taken from the previous index.
+"""
+import numpy as np
+
+# Sort key of a row: `country_code << YEAR_BITS | year`
+YEAR_BITS = 16
+
+
+class SelectionIndex:
+    def __init__(self, df, previous=None, changed=()):
+        """Index `df`.
+
+        Given the `previous` index, of the first rows of `df`, only the rows
+        after them are keyed and only the `changed` countries are rescanned.
+        """
+        self.df = df
+        country = df['country'].cat
+        self._country_codes = {c: i for i, c in enumerate(country.categories)}
+        self._codes = country.codes.to_numpy()
+        self._years = df['year'].to_numpy()
+        sex = df['sex'].cat
+        self._sex_codes = sex.codes.to_numpy()
+        self._sex_lookup = {s: i for i, s in enumerate(sex.categories)}
+        if previous is None:
+            keys = self._key(0, len(df))
+            # A run ends wherever the key goes down
+            cuts = np.flatnonzero(keys[1:] < keys[:-1]) + 1
+            bounds = [0, *cuts.tolist(), len(df)]
+            self._runs = list(zip(bounds[:-1], bounds[1:]))
+            self._keys = np.split(keys, cuts)
+            self._data_years = self._build_data_years()
+        else:
+            start = len(previous.df)
+            self._runs, self._keys = list(previous._runs), list(previous._keys)
+            if len(df) > start:
+                self._runs.append((start, len(df)))
+                self._keys.append(self._key(start, len(df)))
+            self._data_years = {key: years for key, years in previous._data_years.items() if key[0] not in changed}
+            self._data_years.update(self._build_data_years(countries=changed))
+
+    def _key(self, start, stop):
+        return (self._codes[start:stop].astype(np.int64) << YEAR_BITS) + self._years[start:stop]
+
+    def _build_data_years(self, countries=None):
+        # Each (country, year) lies in one run, so the years found in each
+        # run are complete and only need merging
+        data_years = {}
+        for (start, stop), keys in zip(self._runs, self._keys):
+            if countries is None:
+                rows = slice(start, stop)
+            else:
+                # Each country is one block of the run: scan only those blocks
+                wanted = np.array(sorted(self._country_codes[c] for c in countries), dtype=np.int64)
+                starts = start + np.searchsorted(keys, wanted << YEAR_BITS, 'left')
+                stops = start + np.searchsorted(keys, (wanted + 1) << YEAR_BITS, 'left')
+                rows = np.concatenate([np.empty(0, dtype=np.int64)] + [np.arange(a, b) for a, b in zip(starts, stops)])
+            for key, years in self._scan_data_years(rows, countries).items():
+                data_years[key] = np.union1d(data_years[key], years) if key in data_years else years
+        return data_years
+
+    def _scan_data_years(self, rows, countries):
+        country_codes, years, sex_codes = self._codes[rows], self._years[rows], self._sex_codes[rows]
+        # Missing rates count as zero, as they do in `Series.sum()`
+        rates = np.nan_to_num(self.df['suicides_100k_pop'].to_numpy()[rows])
+        n_countries = len(self._country_codes)
+        data_years = {}
+        masks = [('both', None)] + [(sex, sex_codes == code) for sex, code in self._sex_lookup.items()]
+        for sex, mask in masks:
+            codes, values = country_codes, rates
+            if mask is not None:
+                codes, values = codes[mask], values[mask]
+            group_years = years if mask is None else years[mask]
+            if len(codes):
+                # Rows are sorted by (country, year): find where each
+                # country-year group starts and sum the rates of each group
+                starts = np.flatnonzero(np.r_[True, (codes[1:] != codes[:-1]) | (group_years[1:] != group_years[:-1])])
+                has_data = np.add.reduceat(values, starts) != 0
+                codes, group_years = codes[starts][has_data], group_years[starts][has_data]
+            bounds = np.searchsorted(codes, np.arange(n_countries + 1))
+            for country in (self._country_codes if countries is None else countries):
+                code = self._country_codes[country]
+                data_years[country, sex] = group_years[bounds[code]:bounds[code + 1]]
+        return data_years
+
+    @property
+    def countries(self):
+        # Codes of appended countries do not follow label order
+        return sorted(self._country_codes)
+
+    def last_year_with_data(self, country, year, sex='both'):
+        """Latest year `<= year` with a non-zero suicide rate, or None."""
+        years = self._data_years.get((country, sex))
+        if years is None:
+            return None
+        i = int(np.searchsorted(years, year, 'right'))
+        return int(years[i - 1]) if i else None
+
+    def row_ranges(self, spans):
+        """Row ranges `(starts, stops)` of `[(country, (first, last)), ...]`.
+
+        Both are arrays with one row per run and one column per span. All
+        spans are resolved at once: each bound is one binary search per run
+        over the (country, year) sort key, whatever the number of spans.
+        """
+        codes = np.array([self._country_codes.get(country, -1) for country, _ in spans], dtype=np.int64)
+        years = np.array([years for _, years in spans], dtype=np.int64).reshape(len(spans), 2)
+        known = codes >= 0
+        # Clipping keeps a bound outside the data from spilling into the
+        # neighbouring country's block
+        first = np.clip(years[:, 0], 0, 1 << YEAR_BITS)
+        last = np.clip(years[:, 1], -1, (1 << YEAR_BITS) - 1)
+        base = np.where(known, codes, 0) << YEAR_BITS
+        starts = np.empty((len(self._runs), len(spans)), dtype=np.int64)
+        stops = np.empty_like(starts)
+        for i, ((run_start, _), keys) in enumerate(zip(self._runs, self._keys)):
+            starts[i] = run_start + np.searchsorted(keys, base + first, 'left')
+            found = run_start + np.searchsorted(keys, base + last, 'right')
+            stops[i] = np.where(known, np.maximum(found, starts[i]), starts[i])
+        return starts, stops
+
+    def iter_positions(self, spans, sex='both', chunk_rows=65536):
+        """Row positions of all spans in span order, at most `chunk_rows` at a time.
+
+        Never holds all of them: an export of the whole dataset walks it one
+        chunk at a time.
+        """
+        starts, stops = self.row_ranges(spans)
+        batch, size = [], 0
+        for span_starts, span_stops in zip(starts.T.tolist(), stops.T.tolist()):
+            ranges = [(start, stop) for start, stop in zip(span_starts, span_stops) if start < stop]
+            if len(ranges) == 1:
+                rows = range(*ranges[0])
+            else:
+                # Rows from several runs: back in year order, as one run
+                # would hold them
+                rows = np.concatenate([np.empty(0, dtype=np.int64)] + [np.arange(*r) for r in ranges])
+                rows = rows[np.argsort(self._years[rows], kind='stable')]
+            start = 0
+            while start < len(rows):
+                take = min(len(rows) - start, chunk_rows - size)
+                piece = rows[start:start + take]
+                batch.append(np.arange(piece.start, piece.stop) if isinstance(piece, range) else piece)
+                size, start = size + take, start + take
+                if size == chunk_rows:
+                    yield self._filter_sex(np.concatenate(batch), sex)
+                    batch, size = [], 0
+        if batch:
+            yield self._filter_sex(np.concatenate(batch), sex)
+
+    def _filter_sex(self, positions, sex):
+        if sex == 'both':
+            return positions
+        return positions[self._sex_codes[positions] == self._sex_lookup.get(sex, -1)]
@@ -0,0 +1,210 @@
+"""Append new country-years to the dataset without re-parsing it.
+
+A delta (a CSV with the source's header, or JSON records with the same
+fields) is checked against the loaded data: every column present, numbers
+that parse (whole ones for the counts and GDP), labels of `sex`, `age` and
+`generation` the data already uses (a new country is fine), a `country-year`
+matching its country and year, and no (country, year) pair that is already
+loaded, since rows are only ever appended.
+
+The rows are then appended to the CSV and, as a new segment, to the snapshot
+(see `core.snapshot.append`), which writes them and nothing else. Only the
+cells and index entries of the new country-years are computed: the cube of
+the loaded version is copied, a memory copy of its cells rather than a pass
+over the rows, and the rows added to it; only the new segment gets sort
+keys; and the years with data are rescanned only for the countries that got
+rows. The result is swapped in through `core.dataset.apply`, like a reload,
+so caches keyed on the version and the page layouts follow. Other workers
+see the CSV change and load the new snapshot, which does not need a parse
+either.
+
+    python -m core.ingest path/to/delta.csv
+"""
+import io
+import json
+import logging
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from core import dataset, snapshot
+from core.index import SelectionIndex
+
+logger = logging.getLogger(__name__)
+
+KEY = ('country', 'year', 'sex', 'age')
+# Columns whose labels are a fixed set; a delta cannot invent new ones
+FIXED_LABELS = ('sex', 'age', 'generation')
+COUNTS = ('suicides_no', 'population')
+# Listed by row number, up to this many per problem
+MAX_ROWS_LISTED = 5
+
+
+class IngestError(ValueError):
+    """The delta does not fit the dataset; `problems` says why, one per line."""
+
+    def __init__(self, problems):
+        super().__init__('; '.join(problems))
+        self.problems = problems
+
+
+def read_csv(data):
+    """Parse a CSV delta given as bytes."""
+    try:
+        return snapshot.read_source(io.BytesIO(data))
+    except (ValueError, pd.errors.ParserError) as e:
+        raise IngestError([f'unreadable CSV: {e}']) from e
+
+
+def read_records(records):
+    """Parse a JSON delta: a list of objects keyed by column name."""
+    if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+        raise IngestError(['expected a JSON list of objects'])
+    return pd.DataFrame.from_records(records)
+
+
+def _rows(mask):
+    # Row numbers as in the delta file, header excluded
+    numbers = (np.flatnonzero(mask) + 1).tolist()
+    listed = ', '.join(map(str, numbers[:MAX_ROWS_LISTED]))
+    return listed + (f' and {len(numbers) - MAX_ROWS_LISTED} more' if len(numbers) > MAX_ROWS_LISTED else '')
+
+
+def validate(delta, data):
+    """Rows of `delta` in the columns and dtypes of `data.df`, or `IngestError`."""
+    df = data.df
+    # `country-year` can be left out; it is derived from the key
+    missing = [name for name in df.columns if name not in delta.columns and name != 'country-year']
+    unknown = [name for name in delta.columns if name not in df.columns]
+    if missing or unknown:
+        raise IngestError([f'missing column {name!r}' for name in missing]
+                          + [f'unknown column {name!r}' for name in unknown])
+    if not len(delta):
+        raise IngestError(['no rows'])
+
+    delta = delta.reset_index(drop=True)
+    problems = []
+    rows = {}
+    for name in df.columns:
+        if name not in delta.columns:
+            continue
+        values = delta[name]
+        if isinstance(df[name].dtype, pd.CategoricalDtype):
+            values = values.astype(object).where(values.notna())
+            rows[name] = values.map(lambda v: v if pd.isna(v) else str(v).strip())
+            continue
+        if values.dtype == object:
+            values = values.map(lambda v: v.replace(',', '') if isinstance(v, str) else v)
+        numbers = pd.to_numeric(values, errors='coerce')
+        bad = numbers.isna() & values.notna() & (values.astype(str).str.strip() != '')
+        if bad.any():
+            problems.append(f'{name}: not a number in rows {_rows(bad)}')
+        if pd.api.types.is_integer_dtype(df[name].dtype):
+            bad = numbers.isna() | (numbers.fillna(0) % 1 != 0)
+            if bad.any():
+                problems.append(f'{name}: whole number required in rows {_rows(bad)}')
+            numbers = numbers.fillna(0).round()
+        elif name in snapshot.INTEGER_COLUMNS:
+            # Stored as floats only because the source misses some
+            bad = numbers.notna() & (numbers % 1 != 0)
+            if bad.any():
+                problems.append(f'{name}: whole number required in rows {_rows(bad)}')
+        rows[name] = numbers.astype(df[name].dtype)
+    rows = pd.DataFrame(rows)
+
+    for name in KEY:
+        if rows[name].isna().any():
+            problems.append(f'{name}: missing in rows {_rows(rows[name].isna())}')
+    for name in FIXED_LABELS:
+        bad = rows[name].notna() & ~rows[name].isin(df[name].cat.categories)
+        if bad.any():
+            known = ', '.join(map(str, df[name].cat.categories))
+            problems.append(f'{name}: unknown label in rows {_rows(bad)} (expected one of {known})')
+    for name in COUNTS:
+        bad = rows[name] < 0
+        if bad.any():
+            problems.append(f'{name}: negative in rows {_rows(bad)}')
+
+    country_year = rows['country'].fillna('') + rows['year'].astype(str)
+    if 'country-year' in rows:
+        bad = rows['country-year'].notna() & (rows['country-year'] != country_year)
+        if bad.any():
+            problems.append(f'country-year: does not match country and year in rows {_rows(bad)}')
+    rows['country-year'] = country_year
+
+    duplicated = rows.duplicated(list(KEY), keep=False)
+    if duplicated.any():
+        problems.append(f'rows {_rows(duplicated)} repeat the same (country, year, sex, age)')
+    if problems:
+        raise IngestError(problems)
+
+    # Appending only: a (country, year) already loaded would need its
+    # existing rows replaced, which is a reload's job
+    pairs = sorted(set(zip(rows['country'], rows['year'].tolist())))
+    starts, stops = data.index.row_ranges([(country, (year, year)) for country, year in pairs])
+    loaded = [f'{country} {year}' for (country, year), n in zip(pairs, (stops - starts).sum(axis=0)) if n]
+    if loaded:
+        raise IngestError([f'already loaded: {", ".join(loaded[:MAX_ROWS_LISTED])}'
+                           + (f' and {len(loaded) - MAX_ROWS_LISTED} more' if len(loaded) > MAX_ROWS_LISTED else '')])
+    return rows[list(df.columns)]
+
+
+def ingest(delta):
+    """Validate `delta`, append it and swap in the result; return a summary.
+
+    Raises `IngestError` when the delta is rejected, in which case nothing
+    was written.
+    """
+    started = time.perf_counter()
+    appended = {}
+
+    def change(data):
+        rows = validate(delta, data)
+        manifest = snapshot.append(rows, expected=data.version)
+        df = snapshot.load(manifest)
+        countries = set(rows['country'])
+        appended.update(rows=rows, new_countries=countries - set(data.index.countries))
+        return dataset.Data(
+            df, SelectionIndex(df, data.index, countries), data.cube.add(rows), manifest['source_hash'],
+            (manifest['source_size'], manifest['source_mtime_ns']),
+        )
+
+    try:
+        data = dataset.apply(change)
+    except snapshot.SnapshotChanged:
+        # Another process appended, or a new file landed, since this worker
+        # last loaded: catch up, then validate against the newer data
+        dataset.reload()
+        data = dataset.apply(change)
+
+    rows = appended['rows']
+    summary = {
+        'version': data.version,
+        'rows': len(rows),
+        'total_rows': len(data.df),
+        'country_years': sorted(f'{c} {y}' for c, y in set(zip(rows['country'], rows['year'].tolist()))),
+        'new_countries': sorted(appended['new_countries']),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+    logger.info('Ingested %d rows (%d country-years) in %.3f s', summary['rows'],
+                len(summary['country_years']), summary['seconds'])
+    return summary
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        sys.exit('usage: python -m core.ingest path/to/delta.csv')
+    with open(argv[0], 'rb') as f:
+        delta = read_csv(f.read())
+    try:
+        summary = ingest(delta)
+    except IngestError as e:
+        sys.exit('Rejected:\n' + '\n'.join(f'- {problem}' for problem in e.problems))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
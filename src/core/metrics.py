@@ -0,0 +1,184 @@
+"""Per-callback metrics of the Flask server, in Prometheus text format.
+
+Every POST to `/_dash-update-component` is timed from `before_request` to
+`after_request` and labelled with the outputs Dash names in the request
+(e.g. `data-store-single.data`), so one label is one callback. Each worker
+keeps, per callback, histograms of wall time and response size and counters
+of requests by status, request and response bytes, and rows touched: the
+dataset rows of the selections the callback read through `core.results`.
+Response sizes are the serialized JSON; the bytes actually sent after
+`core.transport` compressed it are counted next to them. `render()` formats
+all of it, with the counters of every `core.cache` cache and the totals of
+the compression, for the `/metrics` endpoint.
+
+Callbacks slower than `config.SLOW_CALLBACK_MS` are also logged with their
+inputs, to match slider jank reports against the selections behind them.
+
+Like `/cache-stats`, the numbers are those of the worker that answers the
+scrape; sum them across workers on the Prometheus side.
+"""
+import bisect
+import json
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import request
+
+import config
+from core import cache, transport
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # The last slot counts observations above every bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class CallbackMetrics:
+    def __init__(self):
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.response_size = Histogram(SIZE_BUCKETS)
+        self.requests = Counter()
+        self.request_bytes = self.response_bytes = self.sent_bytes = self.rows = 0
+
+
+_callbacks = defaultdict(CallbackMetrics)
+_lock = threading.Lock()
+# The request a thread is serving, if it is a callback
+_local = threading.local()
+
+
+def rows_touched(count):
+    """Count `count` dataset rows against the callback being served, if any."""
+    if getattr(_local, 'rows', None) is not None:
+        _local.rows += count
+
+
+def record(callback, seconds, status, request_bytes, response_bytes, sent_bytes, rows):
+    with _lock:
+        metrics = _callbacks[callback]
+        metrics.duration.observe(seconds)
+        metrics.response_size.observe(response_bytes)
+        metrics.requests[status] += 1
+        metrics.request_bytes += request_bytes
+        metrics.response_bytes += response_bytes
+        metrics.sent_bytes += sent_bytes
+        metrics.rows += rows
+
+
+def _callback_name(body):
+    # Multi-output callbacks are named '..id.prop...id.prop..' by Dash
+    return body.get('output', 'unknown').strip('.').replace('...', ',')
+
+
+def instrument(server):
+    """Record every callback request `server` handles."""
+    @server.before_request
+    def start_callback():
+        if request.method == 'POST' and request.path.endswith('/_dash-update-component'):
+            _local.started = time.perf_counter()
+            _local.rows = 0
+
+    @server.after_request
+    def finish_callback(response):
+        started = getattr(_local, 'started', None)
+        if started is None:
+            return response
+        seconds = time.perf_counter() - started
+        rows, _local.started, _local.rows = _local.rows, None, None
+
+        body = request.get_json(silent=True) or {}
+        callback = _callback_name(body)
+        request_bytes = len(request.get_data())
+        sent_bytes = response.calculate_content_length() or 0
+        # Compression runs first (its hook is registered later) and notes
+        # the serialized size
+        response_bytes = getattr(response, 'uncompressed_length', sent_bytes)
+        record(callback, seconds, response.status_code, request_bytes, response_bytes, sent_bytes, rows)
+
+        if config.SLOW_CALLBACK_MS and seconds * 1e3 >= config.SLOW_CALLBACK_MS:
+            inputs = {f"{i.get('id')}.{i.get('property')}": i.get('value') for i in body.get('inputs', [])}
+            logger.warning('Slow callback %s: %.0f ms, status %d, %d rows, %d bytes in, %d bytes out (%d sent), '
+                           'inputs %.500s', callback, seconds * 1e3, response.status_code, rows, request_bytes,
+                           response_bytes, sent_bytes, json.dumps(inputs, default=str))
+        return response
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _histogram(lines, name, labels, histogram):
+    cumulative = 0
+    for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{_labels(**labels, le=bound)} {cumulative}')
+    lines.append(f'{name}_sum{_labels(**labels)} {histogram.sum}')
+    lines.append(f'{name}_count{_labels(**labels)} {cumulative}')
+
+
+def render():
+    """Every metric of this worker in the Prometheus text exposition format."""
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for sample in samples:
+            if kind == 'histogram':
+                _histogram(lines, name, *sample)
+            else:
+                labels, value = sample
+                lines.append(f'{name}{_labels(**labels)} {value}')
+
+    with _lock:
+        callbacks = sorted(_callbacks.items())
+        family('dashboard_callback_duration_seconds', 'histogram', 'Wall time of callback requests.',
+               [({'callback': name}, m.duration) for name, m in callbacks])
+        family('dashboard_callback_response_size_bytes', 'histogram', 'Size of callback responses.',
+               [({'callback': name}, m.response_size) for name, m in callbacks])
+        family('dashboard_callback_requests_total', 'counter', 'Callback requests by HTTP status.',
+               [({'callback': name, 'status': status}, count)
+                for name, m in callbacks for status, count in sorted(m.requests.items())])
+        family('dashboard_callback_request_bytes_total', 'counter', 'Bytes received in callback requests.',
+               [({'callback': name}, m.request_bytes) for name, m in callbacks])
+        family('dashboard_callback_response_bytes_total', 'counter', 'Serialized bytes of callback responses.',
+               [({'callback': name}, m.response_bytes) for name, m in callbacks])
+        family('dashboard_callback_response_sent_bytes_total', 'counter',
+               'Bytes of callback responses as sent, after compression.',
+               [({'callback': name}, m.sent_bytes) for name, m in callbacks])
+        family('dashboard_callback_rows_total', 'counter', 'Dataset rows read by callbacks.',
+               [({'callback': name}, m.rows) for name, m in callbacks])
+
+    caches = sorted(cache.stats().items())
+    for counter in ('hits', 'misses', 'evictions', 'expirations'):
+        family(f'dashboard_cache_{counter}_total', 'counter', f'Cache {counter}.',
+               [({'cache': name}, stats[counter]) for name, stats in caches])
+    family('dashboard_cache_entries', 'gauge', 'Entries held by each cache.',
+           [({'cache': name}, stats['size']) for name, stats in caches])
+
+    compression = sorted(transport.stats().items())
+    family('dashboard_compressed_responses_total', 'counter', 'Responses compressed, by encoding.',
+           [({'encoding': name}, totals['responses']) for name, totals in compression])
+    family('dashboard_compression_input_bytes_total', 'counter', 'Bytes of responses before compression.',
+           [({'encoding': name}, totals['bytes_in']) for name, totals in compression])
+    family('dashboard_compression_output_bytes_total', 'counter', 'Bytes of responses after compression.',
+           [({'encoding': name}, totals['bytes_out']) for name, totals in compression])
+    return '\n'.join(lines) + '\n'
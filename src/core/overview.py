@@ -0,0 +1,90 @@
+"""Every country's yearly series at once, fitted into a drawing budget.
+
+The "All countries" page plots one line per country, for every country or
+any filtered set of them. The series come straight from the cube
+(`Cube.country_years`): a (country, year) matrix of the summed measure per
+sex, cached per dataset version, so a selection is a slice of it rather than
+a `CubeView` and a groupby per country.
+
+How the series are drawn depends on their size (see `fit`):
+
+- up to `config.OVERVIEW_MAX_TRACES` series, one WebGL trace each, with its
+  own legend entry and hover label;
+- more series than that, still every point, packed into one WebGL trace per
+  colour with gaps between the countries: the browser draws a dozen traces
+  instead of thousands, and the hover label names the country;
+- more than `config.OVERVIEW_MAX_POINTS` points, percentile bands across the
+  countries per year (min-max, 10-90, 25-75 and the median), which stay a
+  few hundred points whatever the number of countries. The 'lines' detail
+  skips this and sends every point.
+
+The browser does the same in clientside mode (`all_countries` in
+assets/clientside.js).
+"""
+import warnings
+
+import numpy as np
+
+import config
+from core import dataset
+from core.cache import LRUCache
+
+MEASURE = 'suicides_100k_pop'
+# (low, high) percentiles of each band, widest first so the narrower ones
+# are drawn on top
+BANDS = ((0, 100), (10, 90), (25, 75))
+
+_series = LRUCache(maxsize=4, name='overview_series')
+
+
+def _all_series(sex):
+    data = dataset.current()
+    key = (data.version, sex)
+    result = _series.get(key)
+    if result is None:
+        cube = data.cube
+        sums, rows = cube.country_years(MEASURE, sex)
+        # Sums of two-decimal rates: rounding only drops the float noise, and
+        # shortens the JSON. Years without rows are gaps, not zeros
+        values = np.where(rows > 0, np.round(sums, 2), np.nan)
+        result = (cube.labels['country'], cube.labels['year'], values)
+        _series.set(key, result)
+    return result
+
+
+def series(countries, year_range, sex):
+    """`(names, years, values)` of the selected countries, every country if none.
+
+    `values[i, j]` is the measure of the i-th country in the j-th year, NaN
+    where it has no rows. Countries keep the order of the data, so their
+    colours do not depend on the order they were picked in.
+    """
+    names, years, values = _all_series(sex)
+    if countries:
+        keep = np.isin(names, list(countries))
+        names, values = names[keep], values[keep]
+    in_range = (years >= int(year_range[0])) & (years <= int(year_range[1]))
+    return names, years[in_range], values[:, in_range]
+
+
+def points(values):
+    return int(np.count_nonzero(~np.isnan(values)))
+
+
+def fit(values, detail='auto'):
+    """How to draw the series: 'traces', 'packed' or 'bands'."""
+    if detail == 'auto' and points(values) > config.OVERVIEW_MAX_POINTS:
+        return 'bands'
+    if len(values) > config.OVERVIEW_MAX_TRACES:
+        return 'packed'
+    return 'traces'
+
+
+def percentiles(values):
+    """Per year: the percentiles of `BANDS` across the countries, and the median."""
+    qs = sorted({q for band in BANDS for q in band} | {50})
+    with warnings.catch_warnings():
+        # A year without data for any country is a gap
+        warnings.simplefilter('ignore', RuntimeWarning)
+        found = np.nanpercentile(values, qs, axis=0) if len(values) else np.full((len(qs), values.shape[1]), np.nan)
+    return dict(zip(qs, np.round(found, 2)))
@@ -0,0 +1,148 @@
+"""Server-side store for filtered selections.
+
+`update_data_store` used to push the whole filtered frame to the browser as
+records JSON, only for every downstream callback to send it back and rebuild
+a DataFrame from it. Now the frame stays on the server and the `dcc.Store`
+holds a small payload: a cache key plus the normalized selection.
+
+Callbacks get a `view` of the pre-aggregated cube for the selection, computed
+on first use and cached under a key of the selection and the dataset version
+it was computed from.
+
+Results live in an in-process LRU and, when `config.RESULT_CACHE_DIR` is set,
+in a directory of pickles that every worker on the box can read. A worker
+that misses both simply recomputes the selection from the payload, so any
+worker can serve any request. The directory holds at most about
+`config.RESULT_CACHE_DIR_SIZE` pickles: once a worker has saved enough to
+cross that, the least recently used quarter is deleted. Pickles of earlier
+dataset versions are deleted after every reload.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+from dash.exceptions import PreventUpdate
+
+import config
+from core import dataset, metrics, selection
+from core.cache import LRUCache
+
+
+class ResultStore:
+    def __init__(self, maxsize=256, directory=None, directory_size=1024):
+        self.memory = LRUCache(maxsize, name='results')
+        self.directory = Path(directory) if directory else None
+        self.directory_size = directory_size
+        # Files in the directory, as of the last scan plus this worker's
+        # saves since; the files other workers save are counted at the next
+        # scan
+        self._files = 0
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._prune()
+
+    @staticmethod
+    def key(version, selected):
+        # The dataset version is part of the key so a refreshed CSV never
+        # serves stale on-disk results, and leads it so the name of a file
+        # tells which version it belongs to
+        raw = json.dumps([version, selected], sort_keys=True)
+        return f'{ResultStore._prefix(version)}{hashlib.sha1(raw.encode()).hexdigest()}'
+
+    @staticmethod
+    def _prefix(version):
+        return f'{version[:16]}-'
+
+    def _path(self, key):
+        return self.directory / f'{key}.pkl'
+
+    def _load(self, key):
+        result = self.memory.get(key)
+        if result is None and self.directory is not None:
+            path = self._path(key)
+            try:
+                result = pd.read_pickle(path)
+            except (OSError, EOFError, ValueError, pickle.UnpicklingError, AttributeError, ImportError):
+                # Missing, half-written, or pickled by code that has changed
+                # since: recomputed like any miss
+                return None
+            with contextlib.suppress(OSError):
+                # Marks it as recently used for `_prune`
+                os.utime(path)
+            self.memory.set(key, result)
+        return result
+
+    def _save(self, key, result):
+        self.memory.set(key, result)
+        if self.directory is not None:
+            path = self._path(key)
+            added = not path.exists()
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            os.close(fd)
+            pd.to_pickle(result, tmp)
+            os.replace(tmp, path)
+            self._files += added
+            if self._files > self.directory_size:
+                self._prune()
+
+    def _prune(self, keep_prefix=None):
+        # Deletes, given `keep_prefix`, every file of another version and,
+        # past `directory_size` files, the least recently used ones (`_load`
+        # touches what it reads) down to three quarters of it: the next
+        # prune is a quarter of the bound of saves away, not the next save
+        stale, entries = [], []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if not entry.name.endswith('.pkl'):
+                    continue
+                if keep_prefix is not None and not entry.name.startswith(keep_prefix):
+                    stale.append(entry.path)
+                    continue
+                with contextlib.suppress(OSError):
+                    entries.append((entry.stat().st_mtime_ns, entry.path))
+        entries.sort()
+        excess = len(entries) - self.directory_size * 3 // 4 if len(entries) > self.directory_size else 0
+        for path in stale + [path for _, path in entries[:excess]]:
+            with contextlib.suppress(OSError):
+                os.remove(path)
+        self._files = len(entries) - excess
+
+    def remove_stale(self):
+        """Delete the on-disk results of every dataset version but the loaded one."""
+        if self.directory is not None:
+            self._prune(self._prefix(dataset.version()))
+
+    def _get(self, payload, compute):
+        if not payload:
+            # The store starts empty until update_data_store fills it
+            raise PreventUpdate
+        # One version for the whole computation, and the key names that
+        # version rather than the one the payload was made with
+        data = dataset.current()
+        selected = {name: payload[name] for name in ('countries', 'year_range', 'sex')}
+        key = self.key(data.version, selected)
+        result = self._load(key)
+        if result is None:
+            result = compute(data, **selected)
+            self._save(key, result)
+        metrics.rows_touched(int(result.rows.sum()))
+        return result
+
+    def put(self, countries, year_range, sex):
+        """Store payload for a selection; results are computed on first use."""
+        selected = selection.normalize(countries, year_range, sex)
+        return {'key': self.key(dataset.version(), selected), **selected}
+
+    def view(self, payload):
+        """`core.cube.CubeView` for a store payload produced by `put`."""
+        return self._get(payload, selection.view)
+
+
+store = ResultStore(config.RESULT_CACHE_SIZE, config.RESULT_CACHE_DIR, config.RESULT_CACHE_DIR_SIZE)
+# Results of the previous version can never be read again
+dataset.on_reload(store.remove_stale)
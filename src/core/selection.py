@@ -0,0 +1,39 @@
+"""The row selection behind every page's `update_data_store` callback.
+
+`resolve` and `view` read from one `core.dataset.Data`, so the spans are
+clamped and sliced with the same version even while a reload swaps in
+another.
+"""
+
+
+def normalize(countries, year_range, sex):
+    """Canonical, JSON-friendly form of a selection."""
+    if isinstance(countries, str):
+        countries = [countries]
+    return {
+        'countries': list(countries),
+        'year_range': [int(year_range[0]), int(year_range[1])],
+        'sex': sex,
+    }
+
+
+def resolve(data, countries, year_range):
+    """Per-country `(country, (first_year, last_year))` spans of a selection."""
+    index = data.index
+    year_range = list(year_range)
+    spans = []
+    # A country picked twice is selected once
+    for selected_country in dict.fromkeys(countries):
+        # The upper bound is clamped to the last year with data and carried
+        # over from one country to the next
+        last_year = index.last_year_with_data(selected_country, year_range[1])
+        if last_year is not None:
+            year_range[1] = last_year
+        spans.append((selected_country, tuple(year_range)))
+    return spans
+
+
+def view(data, countries, year_range, sex):
+    """The selection as a `core.cube.CubeView`."""
+    return data.cube.view(resolve(data, countries, year_range), sex)
+
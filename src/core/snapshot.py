@@ -0,0 +1,519 @@
+"""Columnar binary snapshot of the dataset.
+
+The CSV is parsed once into one `.npy` file per column. String columns
+(`country`, `sex`, `age`, `generation`, ...) are dictionary-encoded: the file
+holds small integer codes and the manifest holds the category labels. Loading
+memory-maps every file, so start-up costs a few `mmap` calls instead of a CSV
+parse and all processes on the box share the same page cache.
+
+Rows are stored sorted by (country, year, sex) so `core.index` can answer a
+selection with binary searches over contiguous slices.
+
+The CSV is never held in memory whole: `build` parses it `config.CHUNK_ROWS`
+rows at a time, encodes and spills each chunk to disk, then puts the rows in
+order with one sort of a 64-bit key per row and gathers every column into
+place through memory maps. Peak memory is one parsed chunk plus the key and
+its permutation, 8 bytes per row each, instead of the whole parsed frame;
+the file is hashed in the same pass.
+
+The snapshot is rebuilt only when the hash of the source CSV changes: a
+SHA-256 chained over its 1 MiB blocks, so that the manifest can keep the hash
+state of the complete blocks and the hash of a grown file can resume from it.
+`append` adds rows without a rebuild, at a cost that depends on the rows
+added, not on the snapshot: it appends them to the CSV and writes them,
+sorted among themselves, after the existing values of every column file. The
+manifest lists these segments and counts their rows, and records the hash of
+the grown CSV, read from the saved state on, next to its new size and mtime:
+the result is fresh, and stays fresh when the file is merely touched. Labels
+first seen in an append get the next codes, so a column's labels are only
+sorted up to the first append; `core.index` and `core.cube` do not rely on
+it. A rebuild (the command below) merges the segments back into one sorted
+run.
+
+Usage (ingest step, normally run implicitly by `core.dataset`):
+
+    python -m core.snapshot [path/to/master.csv]
+"""
+import contextlib
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import config
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, builds just race
+    fcntl = None
+
+MANIFEST = 'manifest.json'
+FORMAT_VERSION = 3
+
+# Columns that are always dictionary-encoded; any other string column is
+# encoded the same way since `.npy` cannot memory-map Python objects
+DICT_COLUMNS = ('country', 'sex', 'age', 'generation')
+
+# Physical row order of the snapshot
+SORT_COLUMNS = ('country', 'year', 'sex')
+
+# Counts the source writes as whole numbers; pandas reads a column with a
+# missing value as floats, so they may be stored as such
+INTEGER_COLUMNS = ('suicides_no', 'population', ' gdp_for_year ($) ', 'gdp_per_capita ($)')
+
+
+# Bytes per block of the source hash
+HASH_BLOCK = 1 << 20
+
+
+class _SourceDigest:
+    """SHA-256 of a file, chained over its `HASH_BLOCK`-byte blocks.
+
+    The digest of every block is chained into the next. `state()` is the
+    chain up to the last complete block: started from it, a digest reads only
+    the bytes after that block, e.g. of a file that has been appended to.
+    """
+
+    def __init__(self, state=None):
+        self._chain = bytes.fromhex(state['chain']) if state else b''
+        self.offset = state['offset'] if state else 0
+        self._block, self._filled = hashlib.sha256(), 0
+
+    def update(self, data):
+        data = memoryview(data)
+        while len(data):
+            take = min(len(data), HASH_BLOCK - self._filled)
+            self._block.update(data[:take])
+            self._filled += take
+            data = data[take:]
+            if self._filled == HASH_BLOCK:
+                self._chain = hashlib.sha256(self._chain + self._block.digest()).digest()
+                self.offset += HASH_BLOCK
+                self._block, self._filled = hashlib.sha256(), 0
+
+    def state(self):
+        return {'chain': self._chain.hex(), 'offset': self.offset}
+
+    def hexdigest(self):
+        size = str(self.offset + self._filled).encode()
+        return hashlib.sha256(self._chain + self._block.digest() + size).hexdigest()
+
+
+def _digest_file(path, state=None):
+    digest = _SourceDigest(state)
+    with open(path, 'rb') as f:
+        f.seek(digest.offset)
+        for chunk in iter(lambda: f.read(HASH_BLOCK), b''):
+            digest.update(chunk)
+    return digest
+
+
+def file_hash(path):
+    return _digest_file(path).hexdigest()
+
+
+def _codes_dtype(n_categories):
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _encode(values):
+    codes, categories = pd.factorize(values, sort=True)
+    codes = codes.astype(_codes_dtype(len(categories)))
+    return pd.Categorical.from_codes(codes, categories=[str(c) for c in categories])
+
+
+def read_source(csv_path, chunksize=None):
+    # `thousands` turns the quoted "2,15,66,24,900" GDP strings into numbers
+    return pd.read_csv(csv_path, thousands=',', chunksize=chunksize)
+
+
+class _HashingReader(io.RawIOBase):
+    """Binary file wrapper that feeds every byte read to `digest`."""
+
+    def __init__(self, f, digest):
+        self._f = f
+        self._digest = digest
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = self._f.readinto(buffer)
+        self._digest.update(memoryview(buffer)[:n])
+        return n
+
+
+def prepare(df):
+    """Dictionary-encode string columns and sort rows into snapshot order."""
+    df = df.copy()
+    for name in df.columns:
+        if name in DICT_COLUMNS or not pd.api.types.is_numeric_dtype(df[name]):
+            df[name] = _encode(df[name])
+    # Categories are sorted, so sorting by code is sorting by label
+    return df.sort_values(list(SORT_COLUMNS), kind='stable', ignore_index=True)
+
+
+def _new_version_dir(snapshot_dir):
+    snapshot_dir = Path(snapshot_dir)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    return Path(tempfile.mkdtemp(prefix='v-', dir=snapshot_dir))
+
+
+def write(df, snapshot_dir, source_hash, source_stat=None):
+    """Write `df` as a new snapshot version and point the manifest at it."""
+    df = prepare(df)
+    version_dir = _new_version_dir(snapshot_dir)
+    columns = []
+    for i, name in enumerate(df.columns):
+        values = df[name]
+        entry = {'name': name, 'file': f'{i:02d}.npy'}
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            entry['categories'] = list(values.cat.categories)
+            np.save(version_dir / entry['file'], values.cat.codes.to_numpy())
+        else:
+            np.save(version_dir / entry['file'], values.to_numpy())
+        columns.append(entry)
+    return _publish(version_dir, columns, len(df), source_hash, source_stat)
+
+
+def _write_chunks(chunks, version_dir):
+    """Write the rows of `chunks` into `version_dir` in snapshot order.
+
+    Returns the manifest entries of the columns and the row count.
+    """
+    spill = version_dir / 'chunks'
+    spill.mkdir()
+    names, encoded, pieces, labels, n_rows = None, None, {}, {}, 0
+    for i, chunk in enumerate(chunks):
+        if names is None:
+            names = list(chunk.columns)
+            encoded = {name for name in names
+                       if name in DICT_COLUMNS or not pd.api.types.is_numeric_dtype(chunk[name])}
+        for j, name in enumerate(names):
+            values = chunk[name]
+            if name in encoded:
+                # Codes in order of first appearance for now; they are
+                # renumbered in label order once every label has been seen
+                lookup = labels.setdefault(name, {})
+                codes, uniques = pd.factorize(values)
+                mapping = np.array([lookup.setdefault(str(u), len(lookup)) for u in uniques] + [-1], dtype=np.int64)
+                values = mapping[codes]
+            elif not pd.api.types.is_numeric_dtype(values):
+                raise ValueError(f'column {name!r} is not numeric past row {n_rows}')
+            else:
+                values = values.to_numpy()
+            piece = spill / f'{j:02d}-{i:06d}.npy'
+            np.save(piece, values)
+            pieces.setdefault(name, []).append(piece)
+        n_rows += len(chunk)
+
+    def gather(j, name):
+        # The whole column in file order, in a memory-mapped scratch file
+        parts = [np.load(piece, mmap_mode='r') for piece in pieces[name]]
+        if name in encoded:
+            ordered = sorted(labels[name])
+            rank = np.empty(len(ordered) + 1, dtype=np.int64)
+            rank[[labels[name][label] for label in ordered]] = np.arange(len(ordered))
+            rank[-1] = -1
+            dtype = _codes_dtype(len(ordered))
+        else:
+            dtype = np.result_type(*parts)
+        values = np.lib.format.open_memmap(spill / f'{j:02d}.npy', 'w+', dtype, (n_rows,))
+        start = 0
+        for part in parts:
+            values[start:start + len(part)] = rank[part] if name in encoded else part
+            start += len(part)
+        return values
+
+    # One integer per row that orders like (country, year, sex)
+    key = np.zeros(n_rows, dtype=np.int64)
+    for name in SORT_COLUMNS:
+        values = gather(names.index(name), name).astype(np.int64)
+        key = (key << 21) + (values - values.min(initial=0))
+        del values
+    order = np.argsort(key, kind='stable')
+    del key
+
+    columns = []
+    for j, name in enumerate(names):
+        values = gather(j, name)
+        entry = {'name': name, 'file': f'{j:02d}.npy'}
+        if name in encoded:
+            entry['categories'] = sorted(labels[name])
+        out = np.lib.format.open_memmap(version_dir / entry['file'], 'w+', values.dtype, (n_rows,))
+        for start in range(0, n_rows, config.CHUNK_ROWS):
+            out[start:start + config.CHUNK_ROWS] = values[order[start:start + config.CHUNK_ROWS]]
+        out.flush()
+        del out, values
+        columns.append(entry)
+    shutil.rmtree(spill)
+    return columns, n_rows
+
+
+def _publish(version_dir, columns, n_rows, source_hash, source_stat=None, source_state=None):
+    snapshot_dir = version_dir.parent
+    manifest = {
+        'format': FORMAT_VERSION,
+        'version': version_dir.name,
+        'rows': n_rows,
+        # Rows of the snapshot as built, then of each append
+        'segments': [n_rows],
+        'columns': columns,
+        'source_hash': source_hash,
+        # Where `append` resumes the hash of the CSV from (see `_SourceDigest`)
+        'source_state': source_state,
+        'source_size': source_stat.st_size if source_stat else None,
+        'source_mtime_ns': source_stat.st_mtime_ns if source_stat else None,
+    }
+    _write_manifest(snapshot_dir, manifest)
+    _remove_stale_versions(snapshot_dir, keep=version_dir.name)
+    return manifest
+
+
+def _write_manifest(snapshot_dir, manifest):
+    # Readers only ever see a complete manifest: write aside, then rename
+    fd, tmp = tempfile.mkstemp(dir=snapshot_dir, suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        # `dumps` runs the C encoder; `dump` would encode in Python, and the
+        # labels of `country-year` grow with the data
+        f.write(json.dumps(manifest))
+    os.replace(tmp, Path(snapshot_dir) / MANIFEST)
+
+
+def _remove_stale_versions(snapshot_dir, keep):
+    # Processes still mapping an old version keep their pages until they exit
+    for entry in Path(snapshot_dir).iterdir():
+        if entry.is_dir() and entry.name.startswith('v-') and entry.name != keep:
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+def read_manifest(snapshot_dir):
+    try:
+        with open(Path(snapshot_dir) / MANIFEST) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('format') != FORMAT_VERSION:
+        return None
+    return manifest
+
+
+def is_fresh(manifest, csv_path):
+    if manifest is None:
+        return False
+    stat = os.stat(csv_path)
+    if (manifest['source_size'], manifest['source_mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+        return True
+    # The file was touched; only its content decides whether to rebuild
+    return manifest['source_hash'] == file_hash(csv_path)
+
+
+def build(csv_path=None, snapshot_dir=None):
+    csv_path = Path(csv_path or config.DATA_PATH)
+    snapshot_dir = Path(snapshot_dir or config.SNAPSHOT_DIR)
+    stat = os.stat(csv_path)
+    digest = _SourceDigest()
+    version_dir = _new_version_dir(snapshot_dir)
+    with open(csv_path, 'rb', buffering=0) as f:
+        reader = io.BufferedReader(_HashingReader(f, digest), 1 << 20)
+        columns, n_rows = _write_chunks(read_source(reader, chunksize=config.CHUNK_ROWS), version_dir)
+        # Whatever the parser left unread is still part of the file
+        while reader.read(1 << 20):
+            pass
+    return _publish(version_dir, columns, n_rows, digest.hexdigest(), stat, digest.state())
+
+
+@contextlib.contextmanager
+def _build_lock(snapshot_dir):
+    # Several gunicorn workers may start at once; only one should rebuild
+    Path(snapshot_dir).mkdir(parents=True, exist_ok=True)
+    with open(Path(snapshot_dir) / '.lock', 'w') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def ensure(csv_path=None, snapshot_dir=None):
+    """Return an up-to-date manifest, rebuilding the snapshot if needed."""
+    csv_path = Path(csv_path or config.DATA_PATH)
+    snapshot_dir = Path(snapshot_dir or config.SNAPSHOT_DIR)
+    manifest = read_manifest(snapshot_dir)
+    if is_fresh(manifest, csv_path):
+        return manifest
+    with _build_lock(snapshot_dir):
+        # Another process may have finished the rebuild while we waited
+        manifest = read_manifest(snapshot_dir)
+        if not is_fresh(manifest, csv_path):
+            manifest = build(csv_path, snapshot_dir)
+    return manifest
+
+
+class SnapshotChanged(Exception):
+    """The snapshot or its CSV moved on since the data being appended to was loaded."""
+
+
+def _append_source(csv_path, rows):
+    # Same column order and line endings as the file, and whole numbers
+    # without a '.0'; `read_source` reads the plain numbers back just like
+    # the quoted, comma-grouped ones
+    rows = rows.astype({name: 'Int64' for name in INTEGER_COLUMNS if name in rows})
+    with open(csv_path, 'rb') as f:
+        header = f.readline()
+        f.seek(0, os.SEEK_END)
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+    newline = '\r\n' if header.endswith(b'\r\n') else '\n'
+    data = rows.to_csv(header=False, index=False, lineterminator=newline).encode()
+    if last not in (b'', b'\n'):
+        data = newline.encode() + data
+    with open(csv_path, 'ab') as f:
+        f.write(data)
+
+
+def _encode_appended(categories, values):
+    # Codes of the labels `values`; labels not in `categories` get the next
+    # codes, so the codes already written keep their meaning
+    present = values.notna().to_numpy()
+    labels = values[present].astype(str)
+    new = labels[pd.Index(categories).get_indexer(labels) < 0]
+    categories = list(categories) + sorted(set(new))
+    codes = np.full(len(values), -1, dtype=np.int64)
+    codes[present] = pd.Index(categories).get_indexer(labels)
+    return codes, categories
+
+
+def _data_start(path):
+    # Offset and dtype of the values in a `.npy` file
+    with open(path, 'rb') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            _, _, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            _, _, dtype = np.lib.format.read_array_header_2_0(f)
+        return f.tell(), dtype
+
+
+def _map(path, n_rows):
+    """Memory-map the first `n_rows` values of a column file.
+
+    The `.npy` header counts the rows the file was built with; rows appended
+    since follow them in the same file and only the manifest counts them.
+    """
+    offset, dtype = _data_start(path)
+    if not n_rows:
+        return np.empty(0, dtype)
+    return np.memmap(path, dtype, 'r', offset, (n_rows,))
+
+
+def _extend(version_dir, entry, n_rows, values):
+    """Write `values` after the first `n_rows` values of the column of `entry`."""
+    path = version_dir / entry['file']
+    offset, dtype = _data_start(path)
+    if 'categories' in entry and np.dtype(_codes_dtype(len(entry['categories']))).itemsize > dtype.itemsize:
+        # New labels outgrew the codes' integer type: copy the column into a
+        # wider one, a block at a time. The old file stays for processes
+        # still mapping it and goes with the version at the next build
+        dtype = np.dtype(_codes_dtype(len(entry['categories'])))
+        fd, wider = tempfile.mkstemp(prefix=f'{path.stem}-', suffix='.npy', dir=version_dir)
+        os.close(fd)
+        old = _map(path, n_rows)
+        out = np.lib.format.open_memmap(wider, 'w+', dtype, (n_rows,))
+        for start in range(0, n_rows, config.CHUNK_ROWS):
+            out[start:start + config.CHUNK_ROWS] = old[start:start + config.CHUNK_ROWS]
+        out.flush()
+        del out, old
+        path = Path(wider)
+        entry['file'] = path.name
+        offset, _ = _data_start(path)
+    with open(path, 'r+b') as f:
+        # Whatever lies past the manifest's rows was left by an append that
+        # never got to its manifest
+        f.seek(offset + n_rows * dtype.itemsize)
+        f.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+        f.truncate()
+
+
+def append(rows, csv_path=None, snapshot_dir=None, expected=None):
+    """Append `rows` to the CSV and to the snapshot; return its new manifest.
+
+    `rows` have the snapshot's columns and only hold (country, year) pairs
+    it does not have yet (see `core.ingest`). They are sorted among
+    themselves and written after the existing rows of every column file, a
+    new segment; nothing already written is read or rewritten. Raises
+    `SnapshotChanged` unless the snapshot is fresh and, when given, at
+    version `expected`.
+    """
+    csv_path = Path(csv_path or config.DATA_PATH)
+    snapshot_dir = Path(snapshot_dir or config.SNAPSHOT_DIR)
+    with _build_lock(snapshot_dir):
+        manifest = read_manifest(snapshot_dir)
+        if not is_fresh(manifest, csv_path) or expected not in (None, manifest['source_hash']):
+            raise SnapshotChanged
+        _append_source(csv_path, rows)
+        # Only the last, incomplete block and the new lines are read
+        digest = _digest_file(csv_path, manifest.get('source_state'))
+
+        columns, values = [], {}
+        for entry in manifest['columns']:
+            entry = dict(entry)
+            if 'categories' in entry:
+                values[entry['name']], entry['categories'] = _encode_appended(entry['categories'], rows[entry['name']])
+            else:
+                values[entry['name']] = rows[entry['name']].to_numpy()
+            columns.append(entry)
+        # The segment is sorted like the snapshot, by one integer per row
+        # that orders like (country, year, sex)
+        key = np.zeros(len(rows), dtype=np.int64)
+        for name in SORT_COLUMNS:
+            key = (key << 21) + (values[name] - values[name].min(initial=0))
+        order = np.argsort(key, kind='stable')
+
+        version_dir = snapshot_dir / manifest['version']
+        for entry in columns:
+            _extend(version_dir, entry, manifest['rows'], values[entry['name']][order])
+        stat = os.stat(csv_path)
+        manifest = dict(
+            manifest,
+            rows=manifest['rows'] + len(rows),
+            segments=manifest.get('segments', [manifest['rows']]) + [len(rows)],
+            columns=columns,
+            source_hash=digest.hexdigest(),
+            source_state=digest.state(),
+            source_size=stat.st_size,
+            source_mtime_ns=stat.st_mtime_ns,
+        )
+        _write_manifest(snapshot_dir, manifest)
+        return manifest
+
+
+def load(manifest, snapshot_dir=None):
+    """Memory-map a snapshot into a DataFrame without copying column data."""
+    version_dir = Path(snapshot_dir or config.SNAPSHOT_DIR) / manifest['version']
+    columns = []
+    for entry in manifest['columns']:
+        values = _map(version_dir / entry['file'], manifest['rows'])
+        if 'categories' in entry:
+            values = pd.Categorical.from_codes(values, categories=entry['categories'])
+        columns.append(pd.Series(values, name=entry['name'], copy=False))
+    return pd.concat(columns, axis=1, copy=False)
+
+
+if __name__ == '__main__':
+    with _build_lock(config.SNAPSHOT_DIR):
+        manifest = build(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"Wrote {manifest['rows']} rows to {Path(config.SNAPSHOT_DIR) / manifest['version']}")
@@ -0,0 +1,160 @@
+"""How the Flask server's responses are encoded and compressed.
+
+Dash serializes callback outputs and layouts with `plotly.io.json`, whose
+default engine already picks orjson when it is installed: figures and NumPy
+arrays are written by orjson without a per-element Python walk, as long as
+no array has `object` dtype (the pages' outputs do not). `OrjsonProvider`
+moves the rest of Flask's JSON onto orjson too: parsing every callback
+request body, and `jsonify` for `_dash-dependencies` and our own endpoints.
+
+`install` then compresses every text response the client accepts it for:
+brotli when the `brotli` package is installed, gzip otherwise. Callback
+bodies shrink 5-8x, which matters more than encoding time on slow links.
+Responses with an ETag or a cache lifetime (the Dash JavaScript bundles,
+`assets/`) are the same bytes every time, so their compressed bodies are
+cached instead of being recompressed on each request. Streamed responses are
+left alone.
+
+Each compressed response keeps its serialized size in
+`response.uncompressed_length`, for `core.metrics`; `stats()` totals the
+bytes in and out per encoding.
+"""
+import gzip
+import threading
+from collections import defaultdict
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+from core import cache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESSIBLE = {
+    'application/json', 'application/javascript', 'text/javascript', 'text/css', 'text/html', 'text/plain',
+    'image/svg+xml',
+}
+# Below this, the headers outweigh the saving
+MIN_SIZE = 500
+# Levels suited to compressing on every request; cached bodies are few
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+_compressed_bodies = cache.LRUCache(maxsize=64, name='compressed_bodies')
+_totals = defaultdict(lambda: {'responses': 0, 'bytes_in': 0, 'bytes_out': 0})
+_lock = threading.Lock()
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask's JSON through orjson; whatever orjson cannot encode goes the default way."""
+
+    def dumps(self, obj, **kwargs):
+        # `jsonify` asks for compact separators, which is all orjson writes;
+        # other options (`indent`, in debug mode) take the default path
+        if kwargs.get('separators', (',', ':')) == (',', ':') and set(kwargs) <= {'separators'}:
+            # Dates go to `default`, which writes them as Flask does
+            option = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+                      | (orjson.OPT_SORT_KEYS if self.sort_keys else 0))
+            try:
+                return orjson.dumps(obj, default=self.default, option=option).decode()
+            except TypeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        return super().loads(s, **kwargs) if kwargs else orjson.loads(s)
+
+
+def accepted_encodings(header):
+    """Encodings an `Accept-Encoding` header allows, i.e. not given `q=0`."""
+    accepted = set()
+    for item in header.split(','):
+        name, *params = [part.strip() for part in item.split(';')]
+        q = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0
+        if name and q > 0:
+            accepted.add(name.lower())
+    return accepted
+
+
+def _encoding(response):
+    if (request.method == 'HEAD' or response.status_code != 200 or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE):
+        return None
+    # An iterator without a length is a stream meant to go out as it is made
+    if response.is_streamed and not response.direct_passthrough:
+        return None
+    if response.content_length is not None and response.content_length < MIN_SIZE:
+        return None
+    accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response):
+    if response.mimetype in COMPRESSIBLE:
+        response.vary.add('Accept-Encoding')
+    encoding = _encoding(response)
+    if encoding is None:
+        return response
+    # Files sent by `send_file` are read here; they are the static assets
+    response.direct_passthrough = False
+    data = response.get_data()
+    if len(data) < MIN_SIZE:
+        return response
+
+    # Bodies that do not change: tagged ones, and those a browser may cache
+    # under their URL (Dash's fingerprinted bundles)
+    key = response.get_etag()[0] or (request.full_path if response.cache_control.max_age else None)
+    body = _compressed_bodies.get((key, encoding)) if key else None
+    if body is None:
+        body = _compress(data, encoding)
+        if key:
+            _compressed_bodies.set((key, encoding), body)
+    if len(body) >= len(data):
+        return response
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    response.uncompressed_length = len(data)
+    with _lock:
+        totals = _totals[encoding]
+        totals['responses'] += 1
+        totals['bytes_in'] += len(data)
+        totals['bytes_out'] += len(body)
+    return response
+
+
+def stats():
+    """Responses compressed, and bytes before and after, per encoding."""
+    with _lock:
+        return {encoding: dict(totals) for encoding, totals in _totals.items()}
+
+
+def install(server, compression=True):
+    """Use orjson for Flask's JSON and, with `compression`, compress responses."""
+    if orjson is not None:
+        server.json = OrjsonProvider(server)
+    if compression:
+        server.after_request(compress_response)
@@ -0,0 +1,35 @@
+"""Production settings for gunicorn; picked up when it is started from `src`:
+
+    gunicorn app:server
+
+The app is imported once in the master before the workers are forked, so the
+dataset, its index, the pre-aggregated cube and every imported module sit in
+pages the workers share copy-on-write; only what a worker changes afterwards
+(its caches, mostly) is its own. The data columns themselves are
+memory-mapped from the snapshot, so they stay shared even across restarts.
+
+Tunable through the environment:
+- `DASHBOARD_BIND`: address to listen on (default `0.0.0.0:8050`)
+- `DASHBOARD_WORKERS`: worker processes (default: one per CPU)
+- `DASHBOARD_THREADS`: threads per worker (default 2)
+- `DASHBOARD_TIMEOUT`: seconds before a stuck worker is restarted (default 60)
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get('DASHBOARD_BIND', '0.0.0.0:8050')
+workers = int(os.environ.get('DASHBOARD_WORKERS', multiprocessing.cpu_count()))
+# Callbacks mostly hold the GIL, so threads only cover I/O waits; add workers
+# for CPU, they cost little memory once the data is shared
+threads = int(os.environ.get('DASHBOARD_THREADS', 2))
+timeout = int(os.environ.get('DASHBOARD_TIMEOUT', 60))
+
+preload_app = True
+
+
+def pre_fork(server, worker):
+    # Move everything the master loaded out of the collector's reach: a
+    # collection in a worker would otherwise write to every object header and
+    # unshare the pages holding them
+    gc.freeze()
@@ -0,0 +1,159 @@
+import functools
+import dash_bootstrap_components as dbc
+import dash
+from dash.dependencies import Input, Output, State
+from dash import html, dcc
+
+import config
+from core import charts, clientside, dataset, export, overview
+from core.cache import memoize
+
+# Static layout of the results graph; callbacks only patch in its traces
+SUICIDE_RATE_CHART = charts.line_chart('Suicide rate over the years', 'Number of suicides per 100K people')
+
+dash.register_page(__name__, path="/all-countries", title="All countries")
+
+
+def layout(**_):
+    # Rebuilt when the dataset is reloaded, so the dropdown options and the
+    # slider bounds follow the data
+    return _layout(dataset.version())
+
+
+@functools.lru_cache(maxsize=1)
+def _layout(version):
+    df = dataset.get_df()
+    return dbc.Container([
+        # Filters
+        dbc.Col([
+            html.H1('Suicide Rates Dashboard', className='website-heading text-left mt-3'),
+
+            dbc.Col([
+                html.H6('Select year range:', className="year-range-label"),
+
+                # Dropdown section
+                dbc.Col([
+                    html.H6('Countries to plot (all when empty):', className='section-subheading'),
+                    dcc.Dropdown(
+                        id='all-countries-dropdown',
+                        options=dataset.country_options(),
+                        value=[],
+                        multi=True,
+                        placeholder='All countries',
+                        className='mt-2 multiple-country-dropdown'
+                    ),
+                ], className='multiple-country-selector'),
+
+                # Year range slider
+                dbc.Row([
+                    dbc.Col([
+                        dcc.RangeSlider(
+                            id='year-slider-all',
+                            min=df.year.min(),
+                            max=df.year.max(),
+                            value=[df.year.min(), df.year.max()],
+                            marks={str(year): str(year)
+                                for year in range(df.year.min(), df.year.max()+1, 2)},
+                            className='year-range-slider',
+                            vertical=True
+                        )
+                    ])
+                ], className='year-range-selector'),
+
+                # Sex radio buttons
+                dbc.Row([
+                    dbc.Row([
+                        html.H6('Filter by sex:', className="sex-filter-label"),
+                        dcc.RadioItems(
+                            id='sex-radio-all',
+                            options=[
+                                {'label': 'Male', 'value': 'male'},
+                                {'label': 'Female', 'value': 'female'},
+                                {'label': 'Both', 'value': 'both'}
+                            ],
+                            value='both',
+                            className='sex-filter-radio'
+                        )
+                    ])
+                ], className='sex-filter'),
+
+                # Aggregation of large selections
+                dbc.Row([
+                    dbc.Row([
+                        html.H6('Detail:', className="sex-filter-label"),
+                        dcc.RadioItems(
+                            id='detail-radio-all',
+                            options=[
+                                {'label': 'Auto', 'value': 'auto'},
+                                {'label': 'Every line', 'value': 'lines'},
+                            ],
+                            value='auto',
+                            className='sex-filter-radio'
+                        )
+                    ])
+                ], className='sex-filter'),
+
+                # Download of the selection, as on screen
+                export.links('all', clamp=False),
+
+            ], className="multiple-country-filters"),
+        ], className="multiple-country-navigator"),
+
+        # Results
+        dbc.Row([
+            # The drawing budget, for the clientside mode's function
+            dcc.Store(id='all-countries-budget',
+                      data={'max_traces': config.OVERVIEW_MAX_TRACES, 'max_points': config.OVERVIEW_MAX_POINTS}),
+
+            dbc.Col([
+                html.H6(id='all-countries-summary', className="metric-label"),
+                dcc.Graph(id='all-countries-graph', className='graph-result',
+                          figure=charts.figure(SUICIDE_RATE_CHART))
+            ]),
+        ], className='mb-4 mt-4 graph-results'),
+
+    ], fluid=True, className="multiple-country")
+
+
+# The download links follow the selection
+export.register('all', 'all-countries-dropdown', 'year-slider-all', 'sex-radio-all')
+
+
+@clientside.callback(
+    'all_countries',
+    [
+        Output('all-countries-graph', 'figure'),
+        Output('all-countries-summary', 'children'),
+    ],
+    [
+        Input('all-countries-dropdown', 'value'),
+        Input('year-slider-all', 'value'),
+        Input('sex-radio-all', 'value'),
+        Input('detail-radio-all', 'value'),
+    ],
+    state=[
+        State('all-countries-graph', 'figure'),
+        State('all-countries-budget', 'data'),
+    ]
+)
+@memoize()
+def render_all_countries(selected_countries, selected_year_range, selected_sex, detail):
+    names, years, values = overview.series(selected_countries, selected_year_range, selected_sex)
+    how = overview.fit(values, detail)
+    y = overview.MEASURE
+    if how == 'bands':
+        traces = charts.band_traces(years, overview.percentiles(values), y)
+    elif how == 'packed':
+        traces = charts.packed_line_traces(names, years, values, y)
+    else:
+        traces = charts.gl_line_traces(names, years, values, y)
+    return [charts.patch_traces(traces), summary(len(names), overview.points(values), how)]
+
+
+def summary(countries, points, how):
+    text = f'{countries:,} countries, {points:,} points'
+    if how == 'bands':
+        return text + f': more than {config.OVERVIEW_MAX_POINTS:,}, shown as percentiles across the countries'
+    if how == 'packed':
+        return text + ': one WebGL trace per colour, hover a line for its country'
+    return text
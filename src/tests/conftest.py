@@ -0,0 +1,57 @@
+import importlib
+
+import pytest
+
+import config
+from sample import make_rows, write_csv
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    """A small `master.csv`, read with `config.CHUNK_ROWS` set low."""
+    monkeypatch.setattr(config, 'CHUNK_ROWS', 7)
+    path = tmp_path / 'master.csv'
+    write_csv(path, make_rows(['Chile', 'Albania', 'Brazil'], range(1990, 1996)))
+    return path
+
+
+@pytest.fixture
+def loaded(source, tmp_path, monkeypatch):
+    """`core.dataset`, pointed at `source`."""
+    from core import dataset
+    monkeypatch.setattr(config, 'DATA_PATH', source)
+    monkeypatch.setattr(config, 'SNAPSHOT_DIR', tmp_path / 'snap')
+    monkeypatch.setattr(config, 'RELOAD_INTERVAL', 0)
+    monkeypatch.setattr(dataset, '_current', None)
+    return dataset
+
+
+@pytest.fixture
+def app(loaded):
+    """The Dash app, serving `source`."""
+    return importlib.import_module('app').app
+
+
+@pytest.fixture
+def update(app):
+    """POST a callback request the way the browser does; returns the response.
+
+    `outputs` are `'id.property'` strings, `inputs` map them to values.
+    """
+    client = app.server.test_client()
+
+    def post(outputs, inputs, headers=None):
+        def prop(name):
+            component, _, prop_name = name.rpartition('.')
+            return {'id': component, 'property': prop_name}
+
+        body = {
+            'output': outputs[0] if len(outputs) == 1 else '..' + '...'.join(outputs) + '..',
+            'outputs': prop(outputs[0]) if len(outputs) == 1 else [prop(name) for name in outputs],
+            'inputs': [dict(prop(name), value=value) for name, value in inputs.items()],
+            'changedPropIds': [next(iter(inputs)) if inputs else ''],
+            'state': [],
+        }
+        return client.post('/_dash-update-component', json=body, headers=headers or {})
+
+    return post
@@ -0,0 +1,48 @@
+"""Tiny datasets shaped like `master.csv` for the tests."""
+import numpy as np
+
+HEADER = ('country,year,sex,age,suicides_no,population,suicides_100k_pop,country-year,'
+          'HDI for year, gdp_for_year ($) ,gdp_per_capita ($),generation')
+AGES = {'15-24 years': 'Generation X', '55-74 years': 'Silent'}
+
+
+def make_rows(countries, years, seed=0):
+    """Rows of every (country, year, sex, age), shuffled out of snapshot order."""
+    rng = np.random.RandomState(seed)
+    rows = []
+    for country in countries:
+        for year in years:
+            gdp = int(rng.randint(1_000_000, 9_000_000))
+            for sex in ('female', 'male'):
+                for age, generation in AGES.items():
+                    population = int(rng.randint(1000, 100_000))
+                    suicides = int(rng.randint(0, 50))
+                    rows.append({
+                        'country': country, 'year': year, 'sex': sex, 'age': age,
+                        'suicides_no': suicides, 'population': population,
+                        'suicides_100k_pop': round(suicides / population * 1e5, 2),
+                        'country-year': f'{country}{year}',
+                        'HDI for year': round(rng.uniform(0.5, 0.9), 3) if rng.rand() < 0.5 else None,
+                        'gdp': gdp, 'gdp_per_capita ($)': int(gdp // 1000), 'generation': generation,
+                    })
+    return [rows[i] for i in rng.permutation(len(rows))]
+
+
+def write_csv(path, rows, mode='w'):
+    with open(path, mode, newline='') as f:
+        if mode == 'w':
+            f.write(HEADER + '\n')
+        for row in rows:
+            values = [row[name] for name in ('country', 'year', 'sex', 'age', 'suicides_no', 'population',
+                                             'suicides_100k_pop', 'country-year', 'HDI for year')]
+            values = ['' if value is None else str(value) for value in values]
+            # GDP is quoted and comma-grouped, as in the source
+            f.write(','.join(values + [f'"{row["gdp"]:,}"', str(row['gdp_per_capita ($)']), row['generation']]) + '\n')
+
+
+def ingest_rows(tmp_path, rows):
+    """Ingest `rows` through `core.ingest`, as `POST /ingest` does with a CSV."""
+    from core import ingest
+    delta = tmp_path / 'delta.csv'
+    write_csv(delta, rows)
+    return ingest.ingest(ingest.read_csv(delta.read_bytes()))
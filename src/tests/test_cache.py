@@ -0,0 +1,141 @@
+"""`core.cache`: the LRU/TTL cache behind the result store and `memoize`."""
+import numpy as np
+import pytest
+
+from core import cache, dataset
+from core.cache import LRUCache, memoize
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    # Caches made by the tests stay out of the app's registry
+    monkeypatch.setattr(cache, 'registry', {})
+    return cache.registry
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_evicts_the_least_recently_used_entry():
+    lru = LRUCache(maxsize=2)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    # Reading `a` makes `b` the least recently used
+    assert lru.get('a') == 1
+    lru.set('c', 3)
+    assert 'b' not in lru and lru.get('a') == 1 and lru.get('c') == 3
+    assert len(lru) == 2
+    assert lru.stats() == {'size': 2, 'maxsize': 2, 'hits': 3, 'misses': 0, 'evictions': 1, 'expirations': 0}
+
+
+def test_counts_misses_and_returns_the_default():
+    lru = LRUCache(maxsize=2)
+    assert lru.get('missing') is None
+    assert lru.get('missing', 'default') == 'default'
+    lru.set('none', None)
+    assert lru.get('none', 'default') is None
+    assert lru.stats()['misses'] == 2 and lru.stats()['hits'] == 1
+
+
+def test_entries_expire_after_the_ttl(clock):
+    lru = LRUCache(maxsize=4, ttl=10)
+    lru.set('a', 1)
+    clock[0] += 9
+    assert lru.get('a') == 1
+    # Reading does not extend the lifetime
+    clock[0] += 2
+    assert lru.get('a') is None
+    assert 'a' not in lru
+    assert lru.stats()['expirations'] == 1 and lru.stats()['misses'] == 1
+
+
+def test_no_ttl_keeps_entries(clock):
+    lru = LRUCache(maxsize=4, ttl=0)
+    lru.set('a', 1)
+    clock[0] += 1e9
+    assert lru.get('a') == 1
+
+
+def test_registers_by_name(registry):
+    lru = LRUCache(name='tests.registered')
+    lru.set('a', 1)
+    assert registry['tests.registered'] is lru
+    assert cache.stats() == {'tests.registered': lru.stats()}
+
+
+@pytest.fixture
+def version(monkeypatch):
+    current = ['v1']
+    monkeypatch.setattr(dataset, 'version', lambda: current[0])
+    return current
+
+
+def test_memoize_computes_each_input_once(version):
+    calls = []
+
+    @memoize(maxsize=2)
+    def square(x):
+        calls.append(x)
+        return {'value': np.int64(x) ** 2}
+
+    # Stored as plain JSON data
+    assert square(3) == {'value': 9} and type(square(3)['value']) is int
+    assert square(4) == {'value': 16}
+    assert calls == [3, 4]
+    assert square.cache.stats()['hits'] == 1
+
+    # Past maxsize the least recently used input is recomputed
+    square(5)
+    square(3)
+    assert calls == [3, 4, 5, 3]
+
+
+def test_memoize_clears_on_a_new_dataset_version(version):
+    calls = []
+
+    @memoize()
+    def echo(x):
+        calls.append(x)
+        return [x]
+
+    echo('a')
+    echo('a')
+    assert calls == ['a']
+    version[0] = 'v2'
+    assert echo('a') == ['a']
+    assert calls == ['a', 'a']
+    assert len(echo.cache) == 1
+
+
+def test_memoize_keys_on_normalized_inputs(version):
+    calls = []
+
+    @memoize()
+    def first(selection):
+        calls.append(selection)
+        return selection['countries'][0]
+
+    assert first({'countries': ['Chile'], 'sex': 'both'}) == 'Chile'
+    # Same mapping, other key order: a hit
+    assert first({'sex': 'both', 'countries': ['Chile']}) == 'Chile'
+    assert len(calls) == 1
+
+
+def test_memoize_recomputes_after_the_ttl(version, clock):
+    calls = []
+
+    @memoize(ttl=60)
+    def echo(x):
+        calls.append(x)
+        return x
+
+    echo(1)
+    clock[0] += 30
+    echo(1)
+    clock[0] += 31
+    echo(1)
+    assert calls == [1, 1]
@@ -0,0 +1,198 @@
+"""Equivalence checks of the snapshot, index and cube code on tiny datasets.
+
+Each test writes a small CSV shaped like `master.csv` into a temporary
+directory and builds from it with `config.CHUNK_ROWS` set low, so the
+chunked paths cross several chunk boundaries.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import config
+from core import snapshot
+from core.cube import Cube
+from core.index import SelectionIndex
+from sample import ingest_rows, make_rows, write_csv
+
+def frames_equal(left, right):
+    pd.testing.assert_frame_equal(left.reset_index(drop=True), right.reset_index(drop=True))
+
+
+def cubes_equal(left, right):
+    assert left.labels.keys() == right.labels.keys()
+    for dim in left.labels:
+        assert list(left.labels[dim]) == list(right.labels[dim]), dim
+    assert left.first_year == right.first_year
+    np.testing.assert_array_equal(left.rows, right.rows)
+    np.testing.assert_array_equal(left.generation, right.generation)
+    for measure in left.sums:
+        np.testing.assert_array_equal(left.sums[measure], right.sums[measure], err_msg=measure)
+
+
+def test_chunked_build_matches_eager_write(source, tmp_path):
+    chunked = snapshot.build(source, tmp_path / 'chunked')
+    eager = snapshot.write(snapshot.read_source(source), tmp_path / 'eager', snapshot.file_hash(source))
+
+    assert chunked['source_hash'] == eager['source_hash'] == snapshot.file_hash(source)
+    assert chunked['rows'] == eager['rows'] == 3 * 6 * 4
+    assert chunked['columns'] == eager['columns']
+    chunked_df = snapshot.load(chunked, tmp_path / 'chunked')
+    frames_equal(chunked_df, snapshot.load(eager, tmp_path / 'eager'))
+    # Sorted by (country, year, sex), with the GDP strings read as numbers
+    assert list(chunked_df['country'].cat.categories) == ['Albania', 'Brazil', 'Chile']
+    keys = chunked_df[['country', 'year', 'sex']].astype({'country': str, 'sex': str})
+    frames_equal(keys, keys.sort_values(['country', 'year', 'sex'], kind='stable'))
+    assert chunked_df[' gdp_for_year ($) '].dtype.kind in 'if'
+
+
+def test_ensure_rebuilds_only_on_new_content(source, tmp_path):
+    manifest = snapshot.ensure(source, tmp_path / 'snap')
+    assert snapshot.ensure(source, tmp_path / 'snap')['version'] == manifest['version']
+    # Touched, same content: kept
+    source.write_bytes(source.read_bytes())
+    assert snapshot.ensure(source, tmp_path / 'snap')['version'] == manifest['version']
+    write_csv(source, make_rows(['Denmark'], [1990]), mode='a')
+    rebuilt = snapshot.ensure(source, tmp_path / 'snap')
+    assert rebuilt['version'] != manifest['version'] and rebuilt['rows'] == manifest['rows'] + 4
+
+
+def test_chunked_cube_matches_groupby(source, tmp_path, monkeypatch):
+    df = snapshot.load(snapshot.build(source, tmp_path / 'snap'), tmp_path / 'snap')
+    cube = Cube(df)
+    monkeypatch.setattr(config, 'CHUNK_ROWS', 1_000_000)
+    cubes_equal(cube, Cube(df))
+
+    rows = df.astype({name: str for name in df.select_dtypes('category').columns})
+    for keys in (['country', 'year'], ['age'], ['generation'], ['country', 'sex', 'age']):
+        expected = rows.groupby(keys)[['suicides_no', 'population']].sum().reset_index()
+        got = cube.view().frame(*keys)
+        frames_equal(got[keys + ['suicides_no', 'population']].astype({'suicides_no': expected['suicides_no'].dtype}),
+                     expected)
+
+
+def check_matches_rebuild(data, source):
+    full = snapshot.prepare(snapshot.read_source(source))
+    as_str = lambda df: df.astype({name: str for name in df.select_dtypes('category').columns})
+    keys = ['country', 'year', 'sex', 'age']
+    frames_equal(as_str(data.df).sort_values(keys, kind='stable'), as_str(full).sort_values(keys, kind='stable'))
+
+    expected = Cube(full)
+    cubes_equal(data.cube, expected)
+    cubes_equal(Cube(data.df), expected)
+
+    rebuilt = SelectionIndex(full)
+    years = (int(expected.labels['year'][0]), int(expected.labels['year'][-1]))
+    spans = [(country, years) for country in rebuilt.countries] + [('Brazil', (1991, 1993))]
+    for index in (data.index, SelectionIndex(data.df)):
+        assert index.countries == rebuilt.countries
+        assert index._data_years.keys() == rebuilt._data_years.keys()
+        for key, values in rebuilt._data_years.items():
+            np.testing.assert_array_equal(index._data_years[key], values, err_msg=str(key))
+        for sex in ('both', 'female'):
+            got = pd.concat([as_str(index.df.take(p)) for p in index.iter_positions(spans, sex, chunk_rows=5)])
+            want = pd.concat([as_str(rebuilt.df.take(p)) for p in rebuilt.iter_positions(spans, sex, chunk_rows=5)])
+            frames_equal(got, want)
+
+
+def test_ingest_matches_full_rebuild(loaded, source, tmp_path):
+    data = loaded.current()
+    # A later year, an earlier year and a new country, which sorts first
+    summary = ingest_rows(tmp_path, make_rows(['Brazil'], [1996], seed=1) + make_rows(['Albania'], [1989], seed=2)
+                          + make_rows(['Aruba'], [1990, 1991], seed=3))
+    assert summary['rows'] == 16 and summary['new_countries'] == ['Aruba']
+    data = loaded.current()
+    assert data.version == summary['version']
+    check_matches_rebuild(data, source)
+
+    manifest = snapshot.ensure(source, tmp_path / 'snap')
+    assert manifest['source_hash'] == data.version and manifest['segments'] == [72, 16]
+
+    # Enough new countries to outgrow the int8 country codes
+    many = [f'Country {i:03d}' for i in range(130)]
+    ingest_rows(tmp_path, make_rows(many, [1990], seed=4))
+    data = loaded.current()
+    assert data.df['country'].cat.codes.dtype.itemsize > 1
+    check_matches_rebuild(data, source)
+
+
+def test_ingest_keeps_the_hash_of_the_file(loaded, source, tmp_path, monkeypatch):
+    # Blocks small enough for every append to resume the hash mid-file
+    monkeypatch.setattr(snapshot, 'HASH_BLOCK', 256)
+    manifest = snapshot.ensure(source, tmp_path / 'snap')
+    loaded.current()
+    for seed, year in enumerate((1996, 1997), start=1):
+        ingest_rows(tmp_path, make_rows(['Brazil'], [year], seed=seed))
+        appended = snapshot.read_manifest(tmp_path / 'snap')
+        assert appended['source_hash'] == snapshot.file_hash(source) == loaded.current().version
+        assert appended['source_state']['offset'] > 0
+
+    # Touched, or copied over with the same content: no rebuild
+    source.write_bytes(source.read_bytes())
+    fresh = snapshot.ensure(source, tmp_path / 'snap')
+    assert fresh['version'] == manifest['version'] and fresh['segments'] == [72, 4, 4]
+    assert fresh['source_hash'] == appended['source_hash']
+
+
+def test_ingest_appends_lines_in_the_source_format(loaded, source, tmp_path):
+    # A missing count makes pandas read the counts, and the snapshot store
+    # them, as floats
+    rows = make_rows(['Chile', 'Albania'], range(1990, 1993))
+    write_csv(source, [dict(rows[0], suicides_no=None)] + rows[1:])
+    assert loaded.current().df['suicides_no'].dtype.kind == 'f'
+    delta = make_rows(['Peru'], [1990, 1991], seed=1)
+    delta[0]['suicides_no'] = None
+    before = source.read_bytes()
+    ingest_rows(tmp_path, delta)
+
+    appended = source.read_bytes()[len(before):].decode()
+    write_csv(tmp_path / 'expected.csv', delta)
+    expected = (tmp_path / 'expected.csv').read_text().splitlines()[1:]
+    # Plain rather than quoted, comma-grouped GDP, and nothing else changed
+    expected = [line.replace(f'"{row["gdp"]:,}"', str(row['gdp'])) for line, row in zip(expected, delta)]
+    assert appended.splitlines() == expected
+    frames_equal(snapshot.read_source(source).tail(len(delta)), snapshot.read_source(tmp_path / 'expected.csv'))
+
+
+def test_ingest_rejects_fractional_counts(loaded, tmp_path):
+    from core import ingest
+    rows = make_rows(['Peru'], [1990])
+    with pytest.raises(ingest.IngestError, match='suicides_no: whole number required'):
+        ingest_rows(tmp_path, [dict(rows[0], suicides_no=1.5)] + rows[1:])
+
+
+def test_ingest_rejects_loaded_country_years(loaded, tmp_path):
+    from core import ingest
+    version = loaded.current().version
+    with pytest.raises(ingest.IngestError):
+        ingest_rows(tmp_path, make_rows(['Chile'], [1990]))
+    assert loaded.current().version == version
+
+
+def test_resolve_clamps_and_carries_the_upper_bound(loaded, tmp_path):
+    from core import selection
+    # Chile has no rates after 1993
+    ingest_rows(tmp_path, [dict(row, suicides_no=0, suicides_100k_pop=0.0)
+                           for row in make_rows(['Chile'], [1996, 1997], seed=5)])
+    data = loaded.current()
+    assert data.index.last_year_with_data('Chile', 1997) == 1995
+    assert selection.resolve(data, ['Chile', 'Albania', 'Chile'], [1990, 1997]) == [
+        ('Chile', (1990, 1995)), ('Albania', (1990, 1995))]
+    # No data at all: the bound is kept
+    assert selection.resolve(data, ['Nowhere'], [1990, 1997]) == [('Nowhere', (1990, 1997))]
+
+
+def test_view_adds_placeholders_for_countries_without_rows(loaded):
+    from core import selection
+    data = loaded.current()
+    spans = [('Albania', (1991, 1992)), ('Nowhere', (1990, 1995)), ('Brazil', (2000, 2005))]
+    frame = data.cube.view(spans).frame('country', 'year')
+    assert frame[['country', 'year']].values.tolist() == [
+        ['Albania', 1991], ['Albania', 1992], ['Brazil', 2000], ['Nowhere', 1990]]
+    placeholders = frame[frame['country'] != 'Albania']
+    assert (placeholders[['suicides_no', 'population', 'rows']] == 0).all().all()
+
+    rows = data.df[(data.df['country'] == 'Albania') & data.df['year'].between(1991, 1992)
+                   & (data.df['sex'] == 'male')]
+    expected = rows.astype({'age': str}).groupby('age')[['suicides_no', 'population']].sum()
+    got = selection.view(data, ['Albania'], [1991, 1992], 'male').frame('age').set_index('age')
+    np.testing.assert_array_equal(got[['suicides_no', 'population']].to_numpy(), expected.to_numpy())
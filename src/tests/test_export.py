@@ -0,0 +1,35 @@
+"""`GET /export` of the Dash app, on a tiny dataset."""
+import io
+
+import pandas as pd
+import pytest
+
+from core import export
+
+
+def download(app, query):
+    response = app.server.test_client().get(f'/export?{query}')
+    assert response.status_code == 200
+    return response.data
+
+
+def test_csv_holds_the_selected_rows(app):
+    frame = pd.read_csv(io.BytesIO(download(app, 'country=Chile&country=Albania&from=1991&to=1993&sex=male')))
+    assert sorted(frame['country'].unique()) == ['Albania', 'Chile']
+    assert frame['year'].between(1991, 1993).all() and (frame['sex'] == 'male').all()
+    assert len(frame) == 2 * 3 * 2
+
+
+@pytest.mark.skipif('parquet' not in export.FORMATS, reason='needs pyarrow')
+def test_parquet_matches_csv(app):
+    query = 'country=Brazil&from=1990&to=1995&sex=both'
+    csv = pd.read_csv(io.BytesIO(download(app, f'format=csv&{query}')))
+    parquet = pd.read_parquet(io.BytesIO(download(app, f'format=parquet&{query}')))
+    parquet = parquet.astype({name: str for name in parquet.select_dtypes('category').columns})
+    pd.testing.assert_frame_equal(parquet, csv, check_dtype=False)
+
+
+def test_unknown_format_is_rejected(app):
+    response = app.server.test_client().get('/export?format=xlsx')
+    assert response.status_code == 400
+    assert 'format must be one of' in response.get_json()['problems'][0]
@@ -0,0 +1,64 @@
+"""`GET /metrics`: the per-callback metrics of `core.metrics`."""
+import importlib
+
+import pytest
+
+from core import metrics
+
+STORE = 'data-store-multiple.data'
+INPUTS = {'multiple-country-dropdown.value': ['Chile', 'Brazil'], 'year-slider-multiple.value': [1990, 1995],
+          'sex-radio-multiple.value': 'both'}
+
+
+def scrape(app):
+    response = app.server.test_client().get('/metrics')
+    assert response.status_code == 200 and response.content_type == metrics.CONTENT_TYPE
+    return response.get_data(as_text=True)
+
+
+def value(text, name, **labels):
+    prefix = name + metrics._labels(**labels) + ' '
+    found = [line[len(prefix):] for line in text.splitlines() if line.startswith(prefix)]
+    return float(found[0]) if found else 0
+
+
+def test_counts_each_callback_request(app, update):
+    # A memoized result reads no rows
+    importlib.import_module('pages.multiple_country').update_data_store.cache.clear()
+    before = scrape(app)
+    assert update([STORE], INPUTS).status_code == 200
+    # A selection with no rows at all
+    assert update([STORE], dict(INPUTS, **{'multiple-country-dropdown.value': []})).status_code == 200
+    after = scrape(app)
+
+    def added(name, **labels):
+        return value(after, name, **labels) - value(before, name, **labels)
+
+    assert '# TYPE dashboard_callback_duration_seconds histogram' in after
+    assert added('dashboard_callback_duration_seconds_count', callback=STORE) == 2
+    assert added('dashboard_callback_duration_seconds_bucket', callback=STORE, le='+Inf') == 2
+    assert added('dashboard_callback_requests_total', callback=STORE, status=200) == 2
+    assert added('dashboard_callback_request_bytes_total', callback=STORE) > 0
+    assert added('dashboard_callback_response_size_bytes_count', callback=STORE) == 2
+    # Only the first selection had rows: 2 countries, 6 years, 2 sexes, 2 ages
+    assert added('dashboard_callback_rows_total', callback=STORE) == 48
+
+
+def test_multi_output_callbacks_are_labelled_by_every_output(app, update):
+    outputs = ['all-countries-graph.figure', 'all-countries-summary.children']
+    update(outputs, {'all-countries-dropdown.value': [], 'year-slider-all.value': [1990, 1995],
+                     'sex-radio-all.value': 'both', 'detail-radio-all.value': 'auto'})
+    assert value(scrape(app), 'dashboard_callback_duration_seconds_count', callback=','.join(outputs)) >= 1
+
+
+def test_exposes_the_cache_counters(app):
+    text = scrape(app)
+    assert '# TYPE dashboard_cache_hits_total counter' in text
+    assert 'dashboard_cache_entries{cache="results"}' in text
+
+
+@pytest.mark.parametrize('value_, bucket', [(0.004, 0), (0.005, 0), (0.006, 1), (100, -1)])
+def test_histogram_buckets_are_upper_bounds(value_, bucket):
+    histogram = metrics.Histogram(metrics.DURATION_BUCKETS)
+    histogram.observe(value_)
+    assert histogram.counts[bucket] == 1 and sum(histogram.counts) == 1
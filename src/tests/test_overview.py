@@ -0,0 +1,82 @@
+"""The "All countries" chart and its drawing budget (`core.overview`)."""
+import importlib
+
+import pytest
+
+import config
+from core import overview
+from sample import make_rows, write_csv
+
+COUNTRIES = [f'Country {i:02d}' for i in range(60)]
+YEARS = range(1990, 1996)
+OUTPUTS = ['all-countries-graph.figure', 'all-countries-summary.children']
+
+
+@pytest.fixture
+def source(tmp_path):
+    # Overrides the three-country source of conftest.py
+    path = tmp_path / 'master.csv'
+    write_csv(path, make_rows(COUNTRIES, YEARS))
+    return path
+
+
+@pytest.fixture
+def draw(app, update, monkeypatch):
+    """Render the chart under a budget; returns its traces and summary."""
+    render = importlib.import_module('pages.all_countries').render_all_countries
+
+    def draw(max_traces=200, max_points=50000, detail='auto', countries=()):
+        monkeypatch.setattr(config, 'OVERVIEW_MAX_TRACES', max_traces)
+        monkeypatch.setattr(config, 'OVERVIEW_MAX_POINTS', max_points)
+        # Memoized results were drawn under another budget
+        render.cache.clear()
+        response = update(OUTPUTS, {'all-countries-dropdown.value': list(countries),
+                                    'year-slider-all.value': [YEARS[0], YEARS[-1]], 'sex-radio-all.value': 'both',
+                                    'detail-radio-all.value': detail})
+        assert response.status_code == 200
+        outputs = response.get_json()['response']
+        operation, = outputs['all-countries-graph']['figure']['operations']
+        return operation['params']['value'], outputs['all-countries-summary']['children']
+
+    return draw
+
+
+def points(traces):
+    return sum(y is not None for trace in traces for y in trace['y'])
+
+
+def test_one_trace_per_country_within_budget(draw):
+    traces, summary = draw()
+    assert [trace['name'] for trace in traces] == COUNTRIES
+    assert all(trace['type'] == 'scattergl' for trace in traces)
+    assert points(traces) == len(COUNTRIES) * len(YEARS)
+    assert summary == f'{len(COUNTRIES)} countries, {len(COUNTRIES) * len(YEARS)} points'
+
+
+def test_packs_series_past_the_trace_budget(draw):
+    traces, summary = draw(max_traces=10)
+    assert len(traces) <= 10
+    # Every point is still drawn, with gaps between the countries
+    assert points(traces) == len(COUNTRIES) * len(YEARS)
+    assert 'one WebGL trace per colour' in summary
+
+
+def test_bands_stay_under_the_point_budget(draw):
+    traces, summary = draw(max_traces=10, max_points=100)
+    assert points(traces) <= 100
+    assert 'shown as percentiles' in summary
+    # Every point when asked for lines, packed into the trace budget
+    traces, _ = draw(max_traces=10, max_points=100, detail='lines')
+    assert len(traces) <= 10 and points(traces) == len(COUNTRIES) * len(YEARS)
+
+
+def test_a_selection_within_budget_is_drawn_as_is(draw):
+    traces, _ = draw(max_traces=10, max_points=100, countries=COUNTRIES[:3])
+    assert [trace['name'] for trace in traces] == COUNTRIES[:3]
+
+
+def test_percentiles_per_year(loaded):
+    names, years, values = overview.series(COUNTRIES[:5], [1990, 1995], 'both')
+    assert list(names) == COUNTRIES[:5] and list(years) == list(YEARS)
+    bands = overview.percentiles(values)
+    assert (bands[0] <= bands[25]).all() and (bands[25] <= bands[50]).all() and (bands[75] <= bands[100]).all()
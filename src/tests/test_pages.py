@@ -0,0 +1,67 @@
+"""Page callbacks of the Dash app, on a tiny dataset."""
+import importlib
+import json
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+ASSETS = Path(__file__).resolve().parent.parent / 'assets'
+PAGES = {
+    'single': ('pages.single_country', 'Nowhere'),
+    'multiple': ('pages.multiple_country', []),
+    'custom': ('pages.custom_comparison', []),
+}
+
+
+def metric_outputs(app):
+    # Output ids of each clientside metrics function, from the dependencies
+    # the browser loads
+    dependencies = app.server.test_client().get('/_dash-dependencies').get_json()
+    return {dependency['clientside_function']['function_name']: dependency['output'].strip('.').split('...')
+            for dependency in dependencies
+            if (dependency.get('clientside_function') or {}).get('namespace') == 'metrics'}
+
+
+def render_metrics(function_name, data):
+    # Runs assets/metrics.js in node, as the browser would
+    script = (f'global.window = {{dash_clientside: {{}}}};\n{(ASSETS / "metrics.js").read_text()}\n'
+              f'console.log(JSON.stringify(window.dash_clientside.metrics.{function_name}({json.dumps(data)})));')
+    return json.loads(subprocess.run(['node', '-e', script], capture_output=True, text=True, check=True).stdout)
+
+
+@pytest.mark.parametrize('page', PAGES)
+def test_empty_selection_sends_no_metrics(app, page):
+    module, countries = PAGES[page]
+    payload = importlib.import_module(module).update_data_store(countries, [1990, 1995], 'both')
+    assert payload['metrics'] is None
+    assert payload['countries'] == ([countries] if isinstance(countries, str) else countries)
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='needs node')
+@pytest.mark.parametrize('page', PAGES)
+def test_metric_cards_are_blanked_without_metrics(app, page):
+    outputs = metric_outputs(app)[page]
+    for data in (None, {'metrics': None}):
+        values = render_metrics(page, data)
+        assert len(values) == len(outputs)
+        for output, value in zip(outputs, values):
+            if output.endswith('.style'):
+                assert value == {}
+            elif output.split('.')[0].endswith('percent-change'):
+                assert value == ''
+            else:
+                assert value in ('n/a', '')
+        # None of the previous selection's numbers are left on the page
+        assert 'n/a' in values
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='needs node')
+def test_metric_cards_of_a_selection(app):
+    payload = importlib.import_module('pages.multiple_country').update_data_store(['Albania', 'Chile'], [1990, 1995],
+                                                                                 'both')
+    values = render_metrics('multiple', payload)
+    assert len(values) == len(metric_outputs(app)['multiple'])
+    assert values[0] == payload['metrics']['suicides'][0]
+    assert values[3] in ('Albania', 'Chile') and values[5] in ('Albania', 'Chile')
@@ -0,0 +1,97 @@
+"""`core.results.ResultStore` and its on-disk cache."""
+import os
+import pickle
+
+import pytest
+
+from core import dataset, results
+from core.results import ResultStore
+
+
+@pytest.fixture
+def version(monkeypatch):
+    current = ['a' * 64]
+    monkeypatch.setattr(dataset, 'version', lambda: current[0])
+    return current
+
+
+def save(store, version, n, start=0):
+    # `n` results, each saved a second after the one before
+    keys = []
+    for i in range(start, start + n):
+        key = store.key(version, {'countries': [f'Country {i}'], 'year_range': [1990, 1995], 'sex': 'both'})
+        store._save(key, {'result': i})
+        os.utime(store._path(key), ns=(i * 10**9, i * 10**9))
+        keys.append(key)
+    return keys
+
+
+def files(directory):
+    return sorted(path.stem for path in directory.glob('*.pkl'))
+
+
+def test_prunes_the_least_recently_used_past_the_bound(tmp_path, version, monkeypatch):
+    store = ResultStore(maxsize=2, directory=tmp_path, directory_size=8)
+    prunes = []
+    prune = store._prune
+    monkeypatch.setattr(store, '_prune', lambda *args: prunes.append(args) or prune(*args))
+
+    keys = save(store, version[0], 8)
+    # Up to the bound, saving never scans the directory
+    assert prunes == [] and files(tmp_path) == sorted(keys)
+
+    # Read back: the most recently used of all
+    store.memory.clear()
+    assert store._load(keys[0]) == {'result': 0}
+    keys += save(store, version[0], 1, start=8)
+    assert len(prunes) == 1
+    # Down to three quarters of the bound, oldest first
+    assert files(tmp_path) == sorted([keys[0]] + keys[4:])
+
+    # The next prune is two saves away
+    keys += save(store, version[0], 2, start=9)
+    assert len(prunes) == 1
+    keys += save(store, version[0], 1, start=11)
+    assert len(prunes) == 2 and len(files(tmp_path)) == 6
+
+
+def test_counts_the_files_already_there(tmp_path, version):
+    save(ResultStore(directory=tmp_path, directory_size=100), version[0], 10)
+    store = ResultStore(directory=tmp_path, directory_size=8)
+    assert len(files(tmp_path)) == 6
+    save(store, version[0], 2, start=10)
+    assert len(files(tmp_path)) == 8
+    save(store, version[0], 1, start=12)
+    assert len(files(tmp_path)) == 6
+
+
+def test_removes_other_versions_on_reload(tmp_path, version, monkeypatch):
+    store = ResultStore(directory=tmp_path, directory_size=100)
+    old = save(store, version[0], 3)
+    monkeypatch.setattr(dataset, '_listeners', [])
+    dataset.on_reload(store.remove_stale)
+
+    version[0] = 'b' * 64
+    new = save(store, version[0], 2, start=3)
+    dataset._notify()
+    assert files(tmp_path) == sorted(new)
+    assert not set(old) & set(files(tmp_path))
+
+
+def test_the_app_store_listens_for_reloads():
+    assert results.store.remove_stale in dataset._listeners
+
+
+@pytest.mark.parametrize('content', [
+    b'',
+    b'not a pickle',
+    pickle.dumps({'result': 1})[:-3],
+    # Pickled by code that has changed since: a class or module that is gone
+    b'ccore.results\nNoSuchResult\n.',
+    b'cno_such_module\nResult\n.',
+])
+def test_unreadable_files_are_misses(tmp_path, version, content):
+    store = ResultStore(directory=tmp_path)
+    key = store.key(version[0], {'countries': [], 'year_range': [1990, 1995], 'sex': 'both'})
+    store._path(key).write_bytes(content)
+    assert store._load(key) is None
@@ -0,0 +1,78 @@
+"""`core.transport`: orjson for Flask's JSON, and compressed responses."""
+import datetime
+import gzip
+import json
+
+import pytest
+
+from core import transport
+
+# A callback whose response is big enough to be worth compressing
+OUTPUTS = ['all-countries-graph.figure', 'all-countries-summary.children']
+INPUTS = {'all-countries-dropdown.value': [], 'year-slider-all.value': [1990, 1995], 'sex-radio-all.value': 'both',
+          'detail-radio-all.value': 'auto'}
+
+
+@pytest.mark.skipif(transport.orjson is None, reason='needs orjson')
+def test_orjson_provider_round_trips_like_the_default(app):
+    provider = app.server.json
+    assert isinstance(provider, transport.OrjsonProvider)
+    value = {'b': [1, 2.5, None, 'é'], 'a': {'nested': True}, 'when': datetime.date(2020, 1, 2)}
+    encoded = provider.dumps(value, separators=(',', ':'))
+    assert json.loads(encoded) == json.loads(super(transport.OrjsonProvider, provider).dumps(value))
+    assert provider.loads(encoded) == {'b': [1, 2.5, None, 'é'], 'a': {'nested': True},
+                                       'when': 'Thu, 02 Jan 2020 00:00:00 GMT'}
+    # Dash's JSON may have non-string keys, which orjson writes as strings
+    assert provider.loads(provider.dumps({1: 'a'}, separators=(',', ':'))) == {'1': 'a'}
+    # Options orjson lacks go the default way
+    assert provider.dumps({'a': 1}, indent=2) == '{\n  "a": 1\n}'
+
+
+def test_uncompressed_without_accept_encoding(update):
+    response = update(OUTPUTS, INPUTS)
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+
+@pytest.mark.parametrize('header, encoding', [
+    ('gzip', 'gzip'),
+    ('gzip, deflate', 'gzip'),
+    ('*', 'gzip'),
+    ('gzip;q=0', None),
+    ('identity', None),
+])
+def test_gzip_negotiation(update, header, encoding):
+    plain = update(OUTPUTS, INPUTS).get_json()
+    response = update(OUTPUTS, INPUTS, headers={'Accept-Encoding': header})
+    assert response.headers.get('Content-Encoding') == encoding
+    body = gzip.decompress(response.data) if encoding else response.data
+    assert json.loads(body) == plain
+
+
+@pytest.mark.skipif(transport.brotli is None, reason='needs brotli')
+def test_brotli_preferred_when_accepted(update):
+    plain = update(OUTPUTS, INPUTS).get_json()
+    response = update(OUTPUTS, INPUTS, headers={'Accept-Encoding': 'gzip, deflate, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert json.loads(transport.brotli.decompress(response.data)) == plain
+
+
+def test_streamed_responses_are_left_alone(app):
+    response = app.server.test_client().get('/export?format=csv', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200 and response.is_streamed
+    assert 'Content-Encoding' not in response.headers
+    assert response.data.startswith(b'country,year,sex')
+
+
+def test_small_responses_are_left_alone(update):
+    response = update(['data-store-multiple.data'], {'multiple-country-dropdown.value': [],
+                                                     'year-slider-multiple.value': [1990, 1995],
+                                                     'sex-radio-multiple.value': 'both'},
+                      headers={'Accept-Encoding': 'gzip'})
+    assert len(response.data) < transport.MIN_SIZE
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_accepted_encodings():
+    assert transport.accepted_encodings('gzip;q=0.5, br;q=0, Deflate, ;q=1') == {'gzip', 'deflate'}
+    assert transport.accepted_encodings('') == set()